@@ -43,11 +43,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StaticFilesMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'core.middleware.DisableBrowserCacheMiddleware',
 ]
@@ -58,7 +61,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -66,6 +68,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates are kept in memory for the life of the
+            # process; runserver's autoreloader resets them on change.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -78,11 +88,35 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite with WAL and the other pragmas in core.backends.sqlite3.base.
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections across requests instead of reopening (and
+        # re-running the pragmas) every time; checked before each reuse.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Task history, CSV exports and PDF reports can read from a second database
+# so month-end reports don't contend with field updates: locally a snapshot
+# refreshed by `manage.py refresh_reporting_db` (e.g. from cron), in
+# production a replica. Without it they read from default. See core.routers.
+REPORTING_DB_NAME = os.environ.get('REPORTING_DB_NAME')
+if REPORTING_DB_NAME:
+    DATABASES['reporting'] = {
+        **DATABASES['default'],
+        'NAME': REPORTING_DB_NAME,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.routers.ReportingRouter']
+# How long an admin's reads stay on default after they change something;
+# keep it above the snapshot interval or replica lag.
+REPORTING_STICKY_SECONDS = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -120,7 +154,16 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+# collectstatic writes content-hashed names plus .br/.gz copies; templates
+# link to the hashed names once DEBUG is off.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -137,10 +180,53 @@ STATICFILES_DIRS = [
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Media is served to signed-in users by core.views.media_file. Set to
+# 'X-Accel-Redirect' (nginx, with an internal location at
+# MEDIA_SENDFILE_PREFIX aliased to MEDIA_ROOT) or 'X-Sendfile' (Apache)
+# to have the web server send the file.
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER') or None
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
+
+# Uploaded task photos are downscaled to this longest edge and re-encoded
+PHOTO_MAX_DIMENSION = 1600
+PHOTO_FORMAT = 'WEBP'  # or 'JPEG'
+PHOTO_QUALITY = 80
+PHOTO_WORKERS = 2
+
+# Resumable photo uploads from the driver app: partial files live here
+# until complete, then move to MEDIA_ROOT.
+PHOTO_UPLOAD_TEMP_DIR = BASE_DIR / 'upload_tmp'
+PHOTO_UPLOAD_MAX_SIZE = 25 * 1024 * 1024
+PHOTO_UPLOAD_MAX_CHUNK = 4 * 1024 * 1024
+
+# Generated PDF reports (not publicly served)
+REPORTS_ROOT = BASE_DIR / 'reports'
+REPORT_WORKERS = 2
+
+# manage.py backup_db: database snapshots to keep, and the MEDIA_ROOT
+# folders archived incrementally with --media.
+BACKUP_ROOT = BASE_DIR / 'backups'
+BACKUP_KEEP = 14
+BACKUP_MEDIA_DIRS = ['task_photos']
 
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Live task updates for driver dashboards (server-sent events, ASGI only).
+# InMemoryBroker works within one server process; use core.events.RedisBroker
+# (needs the redis package) when running several.
+TASK_EVENT_BROKER = 'core.events.InMemoryBroker'
+TASK_EVENTS_REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+# Dashboard stat cards are cached for this many seconds. Changes expire them
+# at once only in processes sharing the cache, so point CACHES at a shared
+# backend (e.g. Redis or Memcached) when running several workers or when
+# rebuild_task_stats and import_tasks should refresh the dashboards.
+TASK_STATS_CACHE_TIMEOUT = 300
+
+# Requests running more queries than this log a warning when DEBUG is on
+QUERY_BUDGET = 15
+
 # Session Security
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
@@ -0,0 +1,75 @@
+import os
+
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Item, LocationLog, PhotoUpload, Task, TaskPhoto
+from .uploads import temp_path
+
+# Photo slots of the completion form; the visitor form photo is only
+# required when the form was filled.
+REQUIRED_PHOTO_SLOTS = (1, 2, 3, 4, 5)
+VISITOR_FORM_SLOT = 6
+
+
+class CompletionConflict(Exception):
+    """The task was already completed by a different submission."""
+
+
+def complete_task(task, items, images, latitude=None, longitude=None):
+    """Mark ``task`` completed and store its items, photos and final location.
+
+    ``task`` carries the completion flags already; ``images`` are uploaded
+    files or stored file names. One unit of work: either everything is
+    stored or nothing is.
+    """
+    with transaction.atomic(using=task._state.db):
+        task.status = Task.STATUS_COMPLETED
+        task.completed_at = timezone.now()
+        task.save(update_fields=['visitor_form_filled', 'trust_notice_given', 'status', 'completed_at', 'updated_at'])
+
+        for item in items:
+            item.task = task
+        Item.objects.bulk_create(items)
+
+        TaskPhoto.objects.bulk_create(TaskPhoto(task=task, image=image, photo_type='ITEM') for image in images)
+
+        if latitude and longitude:
+            LocationLog.objects.create(task=task, latitude=latitude, longitude=longitude, event='COMPLETE')
+    return task
+
+
+def complete_from_uploads(task, key, items, photo_keys, latitude=None, longitude=None):
+    """Complete ``task`` for the offline submission ``key`` using staged uploads.
+
+    ``photo_keys`` maps form slot to :class:`PhotoUpload` key. Returns False
+    when the same submission already completed the task (a replay) and raises
+    :class:`CompletionConflict` if another one did.
+    """
+    with transaction.atomic():
+        # Conditional UPDATE: of concurrent replays exactly one gets to apply it.
+        claimed = Task.objects.filter(pk=task.pk).exclude(status=Task.STATUS_COMPLETED).update(completion_key=key)
+        if not claimed:
+            if Task.objects.filter(pk=task.pk, completion_key=key).exists():
+                return False
+            raise CompletionConflict(task.pk)
+
+        uploads = {upload.key: upload for upload in PhotoUpload.objects.filter(task=task)}
+        # Copied into the photo store (which de-duplicates) rather than re-pointed.
+        images = [
+            File(uploads[photo_keys[slot]].file.open('rb'), name=os.path.basename(uploads[photo_keys[slot]].file.name))
+            for slot in sorted(photo_keys)
+        ]
+        task.completion_key = key
+        try:
+            complete_task(task, items, images, latitude, longitude)
+        finally:
+            for image in images:
+                image.close()
+        PhotoUpload.objects.filter(task=task).delete()
+
+    for upload in uploads.values():
+        upload.file.delete(save=False)
+        temp_path(upload).unlink(missing_ok=True)
+    return True
@@ -0,0 +1,165 @@
+import asyncio
+import contextlib
+import json
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+CHANNEL = 'task-events'
+KEEPALIVE_SECONDS = 15
+
+TASK_CREATED = 'task.created'
+TASK_CLAIMED = 'task.claimed'
+TASK_CANCELLED = 'task.cancelled'
+# One event for a bulk import; the drivers it concerns reload their task list.
+TASKS_IMPORTED = 'tasks.imported'
+
+
+class InMemoryBroker:
+    """Pub/sub between threads and event loops of a single process.
+
+    Enough when one ASGI server process handles both the views that publish
+    and the event streams; with several processes, use :class:`RedisBroker`.
+    """
+
+    # Events queued for a slow subscriber beyond this are dropped for it.
+    max_backlog = 100
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, message)
+            except RuntimeError:
+                # The subscriber's event loop has shut down.
+                with self._lock:
+                    self._subscribers.discard((loop, queue))
+
+    @staticmethod
+    def _offer(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    async def listen(self):
+        entry = (asyncio.get_running_loop(), asyncio.Queue(self.max_backlog))
+        with self._lock:
+            self._subscribers.add(entry)
+        try:
+            while True:
+                yield await entry[1].get()
+        finally:
+            with self._lock:
+                self._subscribers.discard(entry)
+
+
+class RedisBroker:
+    """Pub/sub over a Redis-compatible server (Redis, Valkey, KeyDB, ...).
+
+    Needs the optional ``redis`` package; the server is ``TASK_EVENTS_REDIS_URL``.
+    """
+
+    def __init__(self):
+        import redis
+
+        self.url = settings.TASK_EVENTS_REDIS_URL
+        self._client = redis.Redis.from_url(self.url)
+
+    def publish(self, message):
+        self._client.publish(CHANNEL, json.dumps(message))
+
+    async def listen(self):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(CHANNEL)
+        try:
+            async for item in pubsub.listen():
+                yield json.loads(item['data'])
+        finally:
+            await pubsub.unsubscribe(CHANNEL)
+            await client.close()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.TASK_EVENT_BROKER)()
+
+
+def task_payload(task):
+    return {
+        'id': task.pk,
+        'donor_name': task.donor_name,
+        'address': task.address[:50],
+        'category': task.get_category_display(),
+        'status': task.status,
+        'status_display': task.get_status_display(),
+        'is_urgent': task.is_urgent,
+        'is_broadcast': task.is_broadcast,
+        'assigned_to_id': task.assigned_to_id,
+    }
+
+
+def event_payload(event, task):
+    if event == TASK_CREATED:
+        return task_payload(task)
+    # Enough to remove the card; donor details only go to drivers who can see the task.
+    return {'id': task.pk, 'is_broadcast': task.is_broadcast, 'assigned_to_id': task.assigned_to_id}
+
+
+def publish_task_event(event, task):
+    """Publish ``event`` for ``task`` once the current transaction commits."""
+    message = {'event': event, 'data': event_payload(event, task)}
+    transaction.on_commit(lambda: get_broker().publish(message), using=task._state.db)
+
+
+def publish_import_event(count, driver_ids, broadcast, using):
+    """Publish one ``TASKS_IMPORTED`` event for ``count`` tasks once the transaction commits."""
+    message = {'event': TASKS_IMPORTED, 'data': {
+        'count': count, 'is_broadcast': broadcast, 'driver_ids': sorted(driver_ids),
+    }}
+    transaction.on_commit(lambda: get_broker().publish(message), using=using)
+
+
+def visible_to_driver(message, driver_id):
+    data = message['data']
+    if message['event'] == TASK_CLAIMED:
+        # Only broadcast tasks can be claimed, so every driver has the card.
+        return True
+    if message['event'] == TASKS_IMPORTED:
+        return data['is_broadcast'] or driver_id in data['driver_ids']
+    return data['is_broadcast'] or data['assigned_to_id'] == driver_id
+
+
+async def driver_event_stream(driver_id):
+    """Server-sent events for one driver's dashboard."""
+    messages = get_broker().listen()
+    pending = asyncio.ensure_future(anext(messages))
+    try:
+        # Let the listener subscribe before telling the client it is connected.
+        await asyncio.sleep(0)
+        yield 'retry: 5000\n\n'
+        while True:
+            done, _ = await asyncio.wait({pending}, timeout=KEEPALIVE_SECONDS)
+            if not done:
+                yield ': keepalive\n\n'
+                continue
+            message = pending.result()
+            pending = asyncio.ensure_future(anext(messages))
+            if visible_to_driver(message, driver_id):
+                yield f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+    finally:
+        pending.cancel()
+        with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+            await pending
+        await messages.aclose()
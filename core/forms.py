@@ -1,5 +1,9 @@
+import re
+
 from django import forms
-from .models import Task, Item, TaskPhoto, User
+from .models import Task, Item, TaskPhoto, PhotoUpload, User
+from .imports import IMPORT_MAX_SIZE
+from .uploads import PHOTO_UPLOAD_MAX_SIZE
 
 class TaskCreationForm(forms.ModelForm):
     class Meta:
@@ -60,3 +64,52 @@ class TaskPhotoMultipleForm(forms.Form):
     image4 = forms.ImageField(label='Photo 4 (Item)', required=True, widget=forms.ClearableFileInput(attrs={'class': 'form-control'}))
     image5 = forms.ImageField(label='Photo 5 (Donor/Front)', required=True, widget=forms.ClearableFileInput(attrs={'class': 'form-control'}))
     image6 = forms.ImageField(label='Photo 6 (Visitor Form)', required=False, widget=forms.ClearableFileInput(attrs={'class': 'form-control'}))
+
+class PhotoUploadForm(forms.ModelForm):
+    """Opens the upload session of one completion photo; the bytes follow in chunks."""
+    class Meta:
+        model = PhotoUpload
+        fields = ['key', 'slot', 'filename', 'size', 'sha256']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in ('size', 'sha256'):
+            self.fields[field].required = True
+
+    def clean_slot(self):
+        slot = self.cleaned_data['slot']
+        if not 1 <= slot <= 6:
+            raise forms.ValidationError("Photo slot must be between 1 and 6.")
+        return slot
+
+    def clean_size(self):
+        size = self.cleaned_data['size']
+        if not 0 < size <= PHOTO_UPLOAD_MAX_SIZE:
+            raise forms.ValidationError(f"Photos must be between 1 byte and {PHOTO_UPLOAD_MAX_SIZE} bytes.")
+        return size
+
+    def clean_sha256(self):
+        sha256 = self.cleaned_data['sha256'].lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', sha256):
+            raise forms.ValidationError("Enter the hex SHA-256 digest of the photo.")
+        return sha256
+
+class TaskImportForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV (UTF-8) or Excel .xlsx, with a header row.",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+    partial = forms.BooleanField(
+        required=False, label="Import the valid rows even if some rows have errors",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+    dry_run = forms.BooleanField(
+        required=False, label="Only check the file; create nothing",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if upload.size > IMPORT_MAX_SIZE:
+            raise forms.ValidationError(f"Import files must be at most {IMPORT_MAX_SIZE} bytes.")
+        return upload
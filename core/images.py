@@ -0,0 +1,127 @@
+import os
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import TaskPhoto
+from .storage import BLOB_DIRECTORY
+
+PHOTO_MAX_DIMENSION = getattr(settings, 'PHOTO_MAX_DIMENSION', 1600)
+PHOTO_FORMAT = getattr(settings, 'PHOTO_FORMAT', 'WEBP')
+PHOTO_QUALITY = getattr(settings, 'PHOTO_QUALITY', 80)
+
+# TaskPhoto field -> longest edge in pixels of the pre-generated rendition.
+RENDITIONS = {
+    'thumbnail': 320,
+    'preview': 640,
+}
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+PHOTO_FIELDS = ('image', 'thumbnail', 'preview')
+# Unreferenced blobs younger than this are kept: see prune_orphaned_blobs().
+PRUNE_GRACE_SECONDS = getattr(settings, 'PHOTO_PRUNE_GRACE_SECONDS', 3600)
+
+
+def _encode(image, max_dimension):
+    rendition = image.copy()
+    rendition.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    if PHOTO_FORMAT == 'JPEG' and rendition.mode != 'RGB':
+        rendition = rendition.convert('RGB')
+    buffer = BytesIO()
+    rendition.save(buffer, format=PHOTO_FORMAT, quality=PHOTO_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def optimise_photo(photo):
+    """Downscale and recompress ``photo.image`` in place and generate its renditions.
+
+    Orientation from EXIF is applied to the pixels before encoding, so the
+    re-encoded files (which carry no EXIF, including GPS tags) display upright.
+    Nothing is saved to the database; the caller saves the instance.
+    """
+    original = photo.image
+
+    with original.open('rb'), Image.open(original) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    stem = os.path.splitext(os.path.basename(original.name))[0]
+    extension = EXTENSIONS[PHOTO_FORMAT]
+    original.save(f'{stem}.{extension}', _encode(image, PHOTO_MAX_DIMENSION), save=False)
+    for field, size in RENDITIONS.items():
+        getattr(photo, field).save(f'{stem}_{size}.{extension}', _encode(image, size), save=False)
+    # The replaced upload is not deleted here: a concurrent identical upload
+    # may be about to reuse its blob. prune_orphaned_blobs() removes it once
+    # it has gone unreferenced for the grace period.
+
+
+def prune_orphaned_blobs(storage, grace_seconds=PRUNE_GRACE_SECONDS, dry_run=False):
+    """Delete stored blobs no TaskPhoto references; return ``(count, bytes)``.
+
+    Blobs written or reused within ``grace_seconds`` are kept, since they may
+    belong to a photo whose row is not committed yet.
+    """
+    referenced = set()
+    for field in PHOTO_FIELDS:
+        referenced.update(TaskPhoto.objects.exclude(**{field: ''}).values_list(field, flat=True))
+
+    pruned = reclaimed = 0
+    for root in blob_roots(storage):
+        for directory, _, files in os.walk(storage.path(root)):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                if name in referenced or time.time() - os.path.getmtime(path) < grace_seconds:
+                    continue
+                pruned += 1
+                reclaimed += os.path.getsize(path)
+                if not dry_run:
+                    storage.delete(name)
+    return pruned, reclaimed
+
+
+def blob_roots(storage):
+    if not os.path.isdir(storage.location):
+        return []
+    return [
+        os.path.join(entry, BLOB_DIRECTORY)
+        for entry in os.listdir(storage.location)
+        if os.path.isdir(storage.path(os.path.join(entry, BLOB_DIRECTORY)))
+    ]
+
+
+def claim_next_photo():
+    """Atomically mark the oldest pending photo as processing and return its id."""
+    pending = TaskPhoto.objects.filter(processing_status=TaskPhoto.PROCESSING_PENDING).order_by('id')
+    for photo_id in pending.values_list('id', flat=True)[:10]:
+        claimed = TaskPhoto.objects.filter(pk=photo_id, processing_status=TaskPhoto.PROCESSING_PENDING).update(
+            processing_status=TaskPhoto.PROCESSING_RUNNING, processing_started_at=timezone.now(),
+        )
+        if claimed:
+            return photo_id
+    return None
+
+
+def process_photo(photo_id):
+    """Optimise a claimed photo and record the outcome. Runs inside a worker process."""
+    photo = TaskPhoto.objects.get(pk=photo_id)
+    try:
+        optimise_photo(photo)
+    except Exception as exc:
+        TaskPhoto.objects.filter(pk=photo_id).update(
+            processing_status=TaskPhoto.PROCESSING_FAILED, processing_error=str(exc),
+        )
+        return TaskPhoto.PROCESSING_FAILED
+    photo.processing_status = TaskPhoto.PROCESSING_DONE
+    photo.processing_error = ''
+    photo.save(update_fields=[
+        'image', 'content_hash', 'width', 'height', 'thumbnail', 'preview', 'processing_status', 'processing_error',
+    ])
+    return TaskPhoto.PROCESSING_DONE
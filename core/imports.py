@@ -0,0 +1,203 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+
+from django import forms
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .events import publish_import_event
+from .models import Task, User
+from .rollups import schedule_refresh
+from .stats import invalidate_task_stats
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_SIZE = getattr(settings, 'TASK_IMPORT_MAX_SIZE', 10 * 1024 * 1024)
+# Spreadsheet header -> field; headers are matched case-insensitively.
+IMPORT_COLUMNS = (
+    'donor_name', 'address', 'phone_numbers', 'location_link', 'category', 'qty', 'is_urgent', 'driver',
+)
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'urgent'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n'}
+
+
+class TaskImportError(Exception):
+    """The file as a whole cannot be read (bad format, missing columns)."""
+
+
+class TaskImportRowForm(forms.Form):
+    """One spreadsheet row. Drivers are resolved by the caller, not per row."""
+    donor_name = forms.CharField(max_length=255)
+    address = forms.CharField()
+    phone_numbers = forms.CharField(max_length=255)
+    location_link = forms.URLField(max_length=500)
+    category = forms.CharField(required=False)
+    qty = forms.IntegerField(min_value=0, required=False)
+    is_urgent = forms.CharField(required=False)
+    driver = forms.CharField(required=False)
+
+    def __init__(self, *args, drivers, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.drivers = drivers
+
+    def clean_category(self):
+        value = self.cleaned_data['category'].strip()
+        if not value:
+            return 'OTHER'
+        for choice, label in Task.CATEGORY_CHOICES:
+            if value.upper() in (choice, label.upper()):
+                return choice
+        raise forms.ValidationError(f'Unknown category "{value}".')
+
+    def clean_is_urgent(self):
+        value = self.cleaned_data['is_urgent'].strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise forms.ValidationError(f'Use yes or no, not "{value}".')
+
+    def clean_driver(self):
+        username = self.cleaned_data['driver'].strip()
+        if not username:
+            return None
+        # Usernames are case-sensitive, so "Sam" and "sam" can both exist.
+        matches = self.drivers.get(username.lower(), {})
+        if username in matches:
+            return matches[username]
+        if not matches:
+            raise forms.ValidationError(f'No driver with username "{username}".')
+        if len(matches) > 1:
+            raise forms.ValidationError(
+                f'Several drivers match "{username}" ({", ".join(sorted(matches))}); use the exact username.'
+            )
+        return next(iter(matches.values()))
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    valid: int = 0
+    created: int = 0
+    # (line number, {column: [{'message': ..., 'code': ...}]}), in file order.
+    errors: list = field(default_factory=list)
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store numbers such as quantities as floats.
+        value = int(value)
+    return str(value).strip()
+
+
+def _records(header, rows):
+    columns = [_cell(name).lower().replace(' ', '_') for name in header]
+    missing = [name for name in IMPORT_COLUMNS[:4] if name not in columns]
+    if missing:
+        raise TaskImportError(f'Missing column(s): {", ".join(missing)}')
+    for line, values in enumerate(rows, start=2):
+        record = {name: _cell(value) for name, value in zip(columns, values) if name in IMPORT_COLUMNS}
+        if any(record.values()):
+            yield line, record
+
+
+def read_rows(upload, name=None):
+    """Yield ``(line, {column: text})`` from a CSV or XLSX file, one row at a time.
+
+    Blank rows are skipped. XLSX needs the optional ``openpyxl`` package.
+    """
+    extension = os.path.splitext(name or getattr(upload, 'name', ''))[1].lower()
+    if extension == '.xlsx':
+        try:
+            import openpyxl
+        except ImportError:
+            raise TaskImportError('Reading .xlsx files needs the openpyxl package; upload a CSV instead.')
+        try:
+            workbook = openpyxl.load_workbook(upload, read_only=True, data_only=True)
+        except Exception as exc:
+            raise TaskImportError(f'Not a readable .xlsx file: {exc}')
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            yield from _records(next(rows, ()), rows)
+        finally:
+            workbook.close()
+    elif extension == '.csv':
+        text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+        try:
+            rows = csv.reader(text)
+            yield from _records(next(rows, []), rows)
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise TaskImportError(f'Not a readable UTF-8 CSV file: {exc}')
+        finally:
+            text.detach()
+    else:
+        raise TaskImportError('Upload a .csv or .xlsx file.')
+
+
+def import_tasks(rows, created_by, dry_run=False, partial=False, batch_size=IMPORT_BATCH_SIZE):
+    """Validate ``rows`` from :func:`read_rows` and create a task for each.
+
+    The whole file is validated first, with drivers looked up once, and the
+    valid rows are spooled to a temporary file rather than kept in memory.
+    Only then is a transaction opened to insert them ``batch_size`` at a time
+    with ``bulk_create``, so the database write lock is not held while the
+    file is parsed. Unless ``partial`` is set, an invalid row means nothing
+    is inserted, so a corrected file can simply be uploaded again. Tasks
+    without a driver are broadcast, as in the create form.
+    """
+    drivers = {}
+    for pk, username in User.objects.filter(role=User.ROLE_DRIVER).values_list('pk', 'username'):
+        drivers.setdefault(username.lower(), {})[username] = pk
+    result = ImportResult()
+    driver_ids = set()
+    broadcast = False
+
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+', encoding='utf-8') as spool:
+        for line, record in rows:
+            result.rows += 1
+            form = TaskImportRowForm(record, drivers=drivers)
+            if not form.is_valid():
+                result.errors.append((line, form.errors.get_json_data()))
+                continue
+            result.valid += 1
+            if dry_run or (result.errors and not partial):
+                # Nothing will be kept; carry on only to report every error.
+                continue
+            spool.write(json.dumps(form.cleaned_data) + '\n')
+            if form.cleaned_data['driver'] is None:
+                broadcast = True
+            else:
+                driver_ids.add(form.cleaned_data['driver'])
+
+        if dry_run or (result.errors and not partial):
+            return result
+        spool.seek(0)
+        with transaction.atomic():
+            batch = []
+            for entry in spool:
+                data = json.loads(entry)
+                batch.append(Task(
+                    donor_name=data['donor_name'], address=data['address'], phone_numbers=data['phone_numbers'],
+                    location_link=data['location_link'], category=data['category'], qty=data['qty'],
+                    is_urgent=data['is_urgent'], assigned_to_id=data['driver'], is_broadcast=data['driver'] is None,
+                    created_by=created_by,
+                ))
+                if len(batch) >= batch_size:
+                    Task.objects.bulk_create(batch)
+                    result.created += len(batch)
+                    batch.clear()
+            if batch:
+                Task.objects.bulk_create(batch)
+                result.created += len(batch)
+            if result.created:
+                # bulk_create sends no post_save: do what the signals would, once.
+                transaction.on_commit(invalidate_task_stats)
+                schedule_refresh(timezone.localdate())
+                publish_import_event(result.created, driver_ids, broadcast, using=DEFAULT_DB_ALIAS)
+    return result
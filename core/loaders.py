@@ -0,0 +1,25 @@
+from django.db.models import Prefetch, Q
+
+from .models import Item, LocationLog, Task, TaskPhoto
+
+
+def task_detail_queryset():
+    """Tasks with everything a detail page or receipt renders, in four queries.
+
+    The task and its users come from one joined query; items, photos and
+    location logs are each prefetched once. Templates can then call
+    ``exists``/``all``/``count`` on those relations without further queries.
+    """
+    return Task.objects.select_related('assigned_to', 'created_by').prefetch_related(
+        Prefetch('items', queryset=Item.objects.order_by('id')),
+        Prefetch('photos', queryset=TaskPhoto.objects.order_by('id')),
+        Prefetch('location_logs', queryset=LocationLog.objects.order_by('timestamp')),
+    )
+
+
+
+def driver_task_queryset(driver):
+    """Open tasks on a driver's dashboard: their own plus every broadcast request."""
+    return Task.objects.filter(
+        Q(assigned_to=driver) | Q(is_broadcast=True)
+    ).exclude(status=Task.STATUS_COMPLETED)
@@ -1,25 +1,217 @@
-from django.core.management.base import BaseCommand
-import shutil
+import gzip
+import hashlib
+import json
 import os
-from django.conf import settings
+import sqlite3
+import tarfile
+import tempfile
 from datetime import datetime
 
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.storage import content_hash
+
+SNAPSHOT_PREFIX = 'db_backup_'
+ARCHIVE_PREFIX = 'media_'
+MANIFEST = 'manifest.json'
+SNAPSHOT_MANIFEST_PREFIX = 'manifest_'
+
+
 class Command(BaseCommand):
-    help = 'Backs up the SQLite database'
+    """Full online snapshots of the database; incremental archives of media.
+
+    Layout under BACKUP_ROOT:
+
+        db/db_backup_<timestamp>.sqlite3.gz    one full, gzipped snapshot per run
+        media/media_<timestamp>.tar.gz         files new or changed since the last run
+        media/manifest.json                    backed-up file -> hash and archive
+        media/manifest_<timestamp>.json        the same, as of that run's snapshot
+
+    To restore, gunzip a snapshot in place of the database and extract each
+    file listed in the manifest of the same run (or the latest one before
+    it) from its archive into MEDIA_ROOT.
+    """
+    help = 'Backs up the SQLite database, and optionally new media files, without blocking writers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--media', action='store_true',
+                            help='Also archive media files added since the last backup')
+        parser.add_argument('--keep', type=int, default=settings.BACKUP_KEEP,
+                            help='Database snapshots to keep; older ones are deleted')
+        parser.add_argument('--verify', action='store_true',
+                            help='Integrity-check the snapshot and re-read what was written')
+        parser.add_argument('--pages', type=int, default=1024,
+                            help='Database pages copied per step of the online backup')
+        parser.add_argument('--sleep', type=float, default=0.01,
+                            help='Seconds to pause between steps so writers can get in')
 
     def handle(self, *args, **options):
-        db_path = settings.DATABASES['default']['NAME']
-        backup_dir = settings.BASE_DIR / 'backups'
-        
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
-            
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"db_backup_{timestamp}.sqlite3"
-        backup_path = backup_dir / backup_filename
-        
-        try:
-            shutil.copy2(db_path, backup_path)
-            self.stdout.write(self.style.SUCCESS(f'Successfully backed up database to "{backup_path}"'))
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error backing up database: {e}'))
+        self.root = settings.BACKUP_ROOT
+        self.verify = options['verify']
+        self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+        self.backup_database(connections[options['database']], options['pages'], options['sleep'])
+        if options['media']:
+            self.backup_media()
+        self.prune(options['keep'])
+
+    def backup_database(self, connection, pages, sleep):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'backup_db only supports SQLite, not {connection.vendor}')
+        directory = os.path.join(self.root, 'db')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{SNAPSHOT_PREFIX}{self.timestamp}.sqlite3.gz')
+
+        with tempfile.TemporaryDirectory(dir=directory) as scratch:
+            copy_path = os.path.join(scratch, 'snapshot.sqlite3')
+            # The online backup copies pages in steps, holding only a read
+            # lock between pauses; pages written meanwhile are picked up again.
+            connection.ensure_connection()
+            target = sqlite3.connect(copy_path)
+            try:
+                with target:
+                    connection.connection.backup(target, pages=pages, sleep=sleep)
+                if self.verify:
+                    self.check_integrity(target)
+            finally:
+                target.close()
+
+            digest = hashlib.sha256()
+            with open(copy_path, 'rb') as source, gzip.open(path + '.tmp', 'wb') as archive:
+                for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                    digest.update(chunk)
+                    archive.write(chunk)
+            size = os.path.getsize(copy_path)
+
+        if self.verify:
+            self.check_snapshot(path + '.tmp', digest.hexdigest())
+        os.replace(path + '.tmp', path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Backed up {size} bytes of database to "{path}" ({os.path.getsize(path)} compressed)'
+        ))
+
+    def check_integrity(self, target):
+        result = target.execute('PRAGMA integrity_check').fetchall()
+        if result != [('ok',)]:
+            raise CommandError('Snapshot failed the integrity check: ' + '; '.join(row[0] for row in result))
+
+    def check_snapshot(self, path, expected):
+        digest = hashlib.sha256()
+        with gzip.open(path, 'rb') as archive:
+            for chunk in iter(lambda: archive.read(1024 * 1024), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != expected:
+            os.remove(path)
+            raise CommandError('Compressed snapshot does not match the database copy')
+        self.stdout.write('Verified database snapshot')
+
+    def backup_media(self):
+        directory = os.path.join(self.root, 'media')
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, MANIFEST)
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as stream:
+                manifest = json.load(stream)
+
+        name = f'{ARCHIVE_PREFIX}{self.timestamp}.tar.gz'
+        changed = []
+        present = set()
+        for relative, path in self.media_files():
+            present.add(relative)
+            stat = os.stat(path)
+            entry = manifest.get(relative)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                continue
+            digest = content_hash(relative) or file_hash(path)
+            if entry and entry['sha256'] == digest:
+                entry['mtime'] = stat.st_mtime
+                continue
+            manifest[relative] = {'sha256': digest, 'size': stat.st_size, 'mtime': stat.st_mtime, 'archive': name}
+            changed.append((relative, path))
+
+        # Deleted files stay in their archives until those age out.
+        for relative in set(manifest) - present:
+            del manifest[relative]
+
+        if changed:
+            path = os.path.join(directory, name)
+            # Photos are already compressed; a light level keeps this fast.
+            with tarfile.open(path + '.tmp', 'w:gz', compresslevel=1) as archive:
+                for relative, source in changed:
+                    archive.add(source, arcname=relative)
+            if self.verify:
+                with tarfile.open(path + '.tmp', 'r:gz') as archive:
+                    if sorted(archive.getnames()) != sorted(relative for relative, _ in changed):
+                        raise CommandError('Media archive does not list the files written to it')
+            os.replace(path + '.tmp', path)
+            self.stdout.write(self.style.SUCCESS(
+                f'Archived {len(changed)} new media file(s) to "{path}" ({os.path.getsize(path)} bytes)'
+            ))
+        else:
+            self.stdout.write('No new media files to archive')
+
+        snapshot_path = os.path.join(directory, f'{SNAPSHOT_MANIFEST_PREFIX}{self.timestamp}.json')
+        for path in (snapshot_path, manifest_path):
+            with open(path + '.tmp', 'w') as stream:
+                json.dump(manifest, stream, indent=1, sort_keys=True)
+            os.replace(path + '.tmp', path)
+
+    def media_files(self):
+        for top in settings.BACKUP_MEDIA_DIRS:
+            for directory, _, files in os.walk(os.path.join(settings.MEDIA_ROOT, top)):
+                for filename in files:
+                    path = os.path.join(directory, filename)
+                    yield os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/'), path
+
+    def prune(self, keep):
+        directory = os.path.join(self.root, 'db')
+        snapshots = sorted(name for name in os.listdir(directory) if name.startswith(SNAPSHOT_PREFIX))
+        expired = snapshots[:-keep] if keep > 0 else []
+        for name in expired:
+            os.remove(os.path.join(directory, name))
+        kept = snapshots[len(expired):]
+
+        pruned_archives = 0
+        media = os.path.join(self.root, 'media')
+        if os.path.isdir(media) and kept:
+            oldest = stamp(kept[0], SNAPSHOT_PREFIX)
+            manifests = sorted(
+                name for name in os.listdir(media)
+                if name.startswith(SNAPSHOT_MANIFEST_PREFIX) and name.endswith('.json')
+            )
+            # A snapshot's media are those of the last manifest written at or
+            # before it, so that one stays along with every later manifest.
+            older = [name for name in manifests if stamp(name, SNAPSHOT_MANIFEST_PREFIX) <= oldest]
+            # Without a manifest that old, the oldest snapshots predate
+            # per-snapshot manifests and any archive may still be needed.
+            if older:
+                for name in older[:-1]:
+                    os.remove(os.path.join(media, name))
+                referenced = set()
+                for name in older[-1:] + manifests[len(older):] + [MANIFEST]:
+                    if os.path.exists(os.path.join(media, name)):
+                        with open(os.path.join(media, name)) as stream:
+                            referenced.update(entry['archive'] for entry in json.load(stream).values())
+                for name in os.listdir(media):
+                    if name.startswith(ARCHIVE_PREFIX) and name.endswith('.tar.gz') and name not in referenced:
+                        os.remove(os.path.join(media, name))
+                        pruned_archives += 1
+
+        if expired or pruned_archives:
+            self.stdout.write(f'Pruned {len(expired)} old snapshot(s) and {pruned_archives} media archive(s)')
+
+
+def stamp(name, prefix):
+    return name[len(prefix):].split('.')[0]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
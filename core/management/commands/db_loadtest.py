@@ -0,0 +1,151 @@
+import copy
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.utils import timezone
+
+from core.loaders import driver_task_queryset
+from core.models import Item, Task, User
+
+ALIAS = 'loadtest'
+DRIVERS = 20
+
+# "before" is Django's stock SQLite setup: rollback journal, a new
+# connection per request and deferred transactions.
+MODES = {
+    'before': {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+    'after': {},
+}
+
+
+class Command(BaseCommand):
+    help = ('Measures read/write throughput of a scratch SQLite database under concurrent '
+            'readers and writers, with the stock settings and with DATABASES["default"]')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Threads loading driver dashboards')
+        parser.add_argument('--writers', type=int, default=4, help='Threads creating and completing tasks')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+        parser.add_argument('--tasks', type=int, default=2000, help='Tasks to seed the database with')
+        parser.add_argument('--mode', choices=[*MODES, 'both'], default='both')
+
+    def handle(self, *args, **options):
+        modes = list(MODES) if options['mode'] == 'both' else [options['mode']]
+        self.stdout.write(f'{options["readers"]} reader(s), {options["writers"]} writer(s), '
+                          f'{options["seconds"]:g}s per run, {options["tasks"]} seeded task(s)')
+        self.stdout.write(f'{"Mode":8} {"reads/s":>9} {"writes/s":>9} {"read p95":>9} {"write p95":>10} {"errors":>7}')
+        for mode in modes:
+            with tempfile.TemporaryDirectory() as directory:
+                self.open_alias(mode, os.path.join(directory, 'loadtest.sqlite3'))
+                try:
+                    self.seed(options['tasks'])
+                    result = self.run(options['readers'], options['writers'], options['seconds'])
+                finally:
+                    self.drop_alias()
+            self.stdout.write(
+                f'{mode:8} {result["reads"]:9.0f} {result["writes"]:9.0f} '
+                f'{result["read_p95"]:7.1f}ms {result["write_p95"]:8.1f}ms {result["errors"]:7}'
+            )
+        self.stdout.write('Errors are requests that failed with "database is locked".')
+
+    def open_alias(self, mode, name):
+        connections.settings[ALIAS] = {
+            **copy.deepcopy(connections.settings['default']),
+            **copy.deepcopy(MODES[mode]),
+            'NAME': name,
+        }
+        with connections[ALIAS].schema_editor() as editor:
+            for model in (User, Task, Item):
+                editor.create_model(model)
+
+    def drop_alias(self):
+        connections[ALIAS].close()
+        del connections[ALIAS]
+        del connections.settings[ALIAS]
+
+    def seed(self, count):
+        users = User.objects.using(ALIAS)
+        self.admin = users.create(username='admin', role=User.ROLE_ADMIN)
+        self.drivers = users.bulk_create(
+            [User(username=f'driver{n}', role=User.ROLE_DRIVER) for n in range(DRIVERS)]
+        )
+        Task.objects.using(ALIAS).bulk_create(self.new_task(n) for n in range(count))
+        connections[ALIAS].close()
+
+    def new_task(self, n):
+        return Task(
+            donor_name=f'Donor {n}', address='Address', phone_numbers='0',
+            location_link='https://maps.example.com/', created_by=self.admin,
+            assigned_to=random.choice(self.drivers), is_broadcast=n % 10 == 0,
+        )
+
+    def read(self):
+        driver = random.choice(self.drivers)
+        tasks = driver_task_queryset(driver).using(ALIAS).select_related('assigned_to')
+        list(tasks.order_by('-id')[:50])
+        Task.objects.using(ALIAS).filter(status=Task.STATUS_COMPLETED).count()
+
+    def write(self):
+        tasks = Task.objects.using(ALIAS)
+        if random.random() < 0.5:
+            tasks.bulk_create([self.new_task(0)])
+            return
+        # A completion reads the task, then writes it and its items.
+        with transaction.atomic(using=ALIAS):
+            task = tasks.exclude(status=Task.STATUS_COMPLETED).order_by('-id').first()
+            if task is None:
+                return
+            tasks.filter(pk=task.pk).update(status=Task.STATUS_COMPLETED, completed_at=timezone.now())
+            Item.objects.using(ALIAS).bulk_create(
+                [Item(task=task, category='Clothes', quantity=n) for n in range(1, 4)]
+            )
+
+    def run(self, readers, writers, seconds):
+        latencies = {self.read: [], self.write: []}
+        errors = []
+        start = threading.Barrier(readers + writers)
+        deadline = []
+
+        def worker(operation):
+            start.wait()
+            if not deadline:
+                deadline.append(time.monotonic() + seconds)
+            timings = []
+            try:
+                while time.monotonic() < deadline[0]:
+                    began = time.monotonic()
+                    try:
+                        operation()
+                    except OperationalError:
+                        errors.append(1)
+                    else:
+                        timings.append(time.monotonic() - began)
+                    # What the request_finished signal does after each request.
+                    connections[ALIAS].close_if_unusable_or_obsolete()
+            finally:
+                connections[ALIAS].close()
+                latencies[operation].extend(timings)
+
+        threads = [threading.Thread(target=worker, args=(self.read,)) for _ in range(readers)]
+        threads += [threading.Thread(target=worker, args=(self.write,)) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        def p95(timings):
+            return statistics.quantiles(timings, n=20)[-1] * 1000 if len(timings) > 1 else 0.0
+
+        return {
+            'reads': len(latencies[self.read]) / seconds,
+            'writes': len(latencies[self.write]) / seconds,
+            'read_p95': p95(latencies[self.read]),
+            'write_p95': p95(latencies[self.write]),
+            'errors': len(errors),
+        }
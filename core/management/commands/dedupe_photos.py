@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.images import PHOTO_FIELDS, prune_orphaned_blobs
+from core.models import TaskPhoto
+from core.storage import blob_name, content_hash
+
+
+class Command(BaseCommand):
+    help = 'Moves task photos into content-addressed storage, collapsing duplicate files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete stored blobs that no photo has referenced for an hour, '
+                                 'such as uploads the photo worker has replaced')
+
+    def handle(self, *args, **options):
+        self.storage = TaskPhoto._meta.get_field('image').storage
+        self.dry_run = options['dry_run']
+
+        self.migrate_files()
+        self.backfill_hashes()
+        if options['prune']:
+            self.prune_orphans()
+
+    def legacy_names(self):
+        names = set()
+        for field in PHOTO_FIELDS:
+            names.update(TaskPhoto.objects.exclude(**{field: ''}).values_list(field, flat=True).distinct())
+        return sorted(name for name in names if not content_hash(name))
+
+    def migrate_files(self):
+        moved = collapsed = missing = reclaimed = 0
+        seen = defaultdict(list)
+        for name in self.legacy_names():
+            if not self.storage.exists(name):
+                missing += 1
+                self.stderr.write(f'Missing file: {name}')
+                continue
+
+            size = self.storage.size(name)
+            if self.dry_run:
+                target = blob_name(name, self.storage.digest(name))
+                if seen[target] or self.storage.exists(target):
+                    collapsed += 1
+                    reclaimed += size
+                else:
+                    moved += 1
+                seen[target].append(name)
+                continue
+
+            target = self.storage.ingest(name)
+            with transaction.atomic():
+                for field in PHOTO_FIELDS:
+                    changes = {field: target}
+                    if field == 'image':
+                        changes['content_hash'] = content_hash(target)
+                    TaskPhoto.objects.filter(**{field: name}).update(**changes)
+            if self.storage.exists(name):
+                # The blob was already stored; this copy is now unreferenced.
+                self.storage.delete(name)
+                collapsed += 1
+                reclaimed += size
+            else:
+                moved += 1
+
+        if self.dry_run:
+            summary = (f'Would move {moved} file(s) into blob storage and collapse {collapsed} '
+                       f'duplicate(s), reclaiming {reclaimed} bytes')
+        else:
+            summary = (f'Moved {moved} file(s) into blob storage, collapsed {collapsed} '
+                       f'duplicate(s), reclaimed {reclaimed} bytes')
+        self.stdout.write(self.style.SUCCESS(summary))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'{missing} referenced file(s) are missing from storage'))
+
+    def backfill_hashes(self):
+        # Rows whose image already points at a blob but never had the hash recorded.
+        filled = 0
+        for pk, name in TaskPhoto.objects.filter(content_hash='').exclude(image='').values_list('pk', 'image'):
+            digest = content_hash(name)
+            if digest:
+                filled += 1
+                if not self.dry_run:
+                    TaskPhoto.objects.filter(pk=pk).update(content_hash=digest)
+        if filled:
+            self.stdout.write(f'Recorded the content hash of {filled} photo(s)')
+
+    def prune_orphans(self):
+        pruned, reclaimed = prune_orphaned_blobs(self.storage, dry_run=self.dry_run)
+        verb = 'Would prune' if self.dry_run else 'Pruned'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {pruned} unreferenced blob(s), {reclaimed} bytes'))
@@ -0,0 +1,60 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import IMPORT_BATCH_SIZE, TaskImportError, import_tasks, read_rows
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = 'Creates tasks from a CSV or XLSX file of donor pickups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='A .csv (UTF-8) or .xlsx file with a header row')
+        parser.add_argument('--user', required=True, help='Username of the admin the tasks are created by')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without creating tasks')
+        parser.add_argument('--partial', action='store_true',
+                            help='Create the valid rows even if other rows have errors')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help='Tasks inserted per INSERT statement')
+        parser.add_argument('--errors', metavar='PATH', help='Write the invalid rows to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user "{options["user"]}"')
+        if not (user.is_admin() or user.is_superuser):
+            raise CommandError(f'"{user.username}" is not an admin')
+
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = import_tasks(
+                    read_rows(stream, name=options['path']), created_by=user, dry_run=options['dry_run'],
+                    partial=options['partial'], batch_size=options['batch_size'],
+                )
+        except OSError as exc:
+            raise CommandError(f'Cannot read "{options["path"]}": {exc}')
+        except TaskImportError as exc:
+            raise CommandError(str(exc))
+
+        for line, errors in result.errors:
+            for column, problems in errors.items():
+                for problem in problems:
+                    self.stderr.write(f'Line {line}, {column}: {problem["message"]}')
+        if options['errors']:
+            self.write_errors(options['errors'], result.errors)
+
+        summary = f'{result.rows} row(s) read, {result.valid} valid, {result.created} task(s) created'
+        if result.errors and not result.created:
+            raise CommandError(f'{summary}; nothing imported because {len(result.errors)} row(s) have errors')
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def write_errors(self, path, errors):
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            writer = csv.writer(stream)
+            writer.writerow(['line', 'column', 'error'])
+            for line, row_errors in errors:
+                for column, problems in row_errors.items():
+                    for problem in problems:
+                        writer.writerow([line, column, problem['message']])
@@ -0,0 +1,73 @@
+import gzip
+import os
+import re
+
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from core.models import Task, User
+
+STYLE = re.compile(rb'<style[^>]*>(.*?)</style>', re.S)
+STYLESHEET = re.compile(rb'<link[^>]+href="/static/([^"?#]+\.css)"')
+
+
+class Command(BaseCommand):
+    help = 'Reports the bytes each main page sends: HTML, inline CSS and linked stylesheets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--admin', default='admin', help='Admin user to render admin pages as')
+        parser.add_argument('--driver', default='driver', help='Driver user to render driver pages as')
+
+    def handle(self, *args, **options):
+        admin = self.get_user(options['admin'], User.ROLE_ADMIN)
+        driver = self.get_user(options['driver'], User.ROLE_DRIVER)
+        task = Task.objects.filter(assigned_to=driver).exclude(status=Task.STATUS_COMPLETED).first()
+        done = Task.objects.filter(status=Task.STATUS_COMPLETED).first()
+
+        pages = [(None, reverse('login'))]
+        pages += [(admin, reverse(name)) for name in (
+            'admin_dashboard', 'task_list', 'task_history', 'task_create', 'driver_list', 'driver_create',
+        )]
+        if done:
+            pages += [(admin, reverse('admin_task_detail', args=[done.pk])), (admin, reverse('receipt_view', args=[done.pk]))]
+        pages.append((driver, reverse('driver_dashboard')))
+        if task:
+            pages += [(driver, reverse('driver_task_detail', args=[task.pk])), (driver, reverse('task_complete', args=[task.pk]))]
+
+        self.stdout.write(f'{"Page":32} {"HTML":>8} {"gzip":>8} {"inline CSS":>11} {"CSS files":>10}')
+        totals = [0, 0, 0]
+        stylesheets = {}
+        for user, url in pages:
+            html = self.fetch(user, url)
+            inline = sum(len(css) for css in STYLE.findall(html))
+            linked = 0
+            for name in STYLESHEET.findall(html):
+                name = name.decode()
+                if name not in stylesheets:
+                    path = finders.find(name)
+                    stylesheets[name] = os.path.getsize(path) if path else 0
+                linked += stylesheets[name]
+            compressed = len(gzip.compress(html))
+            for index, value in enumerate((len(html), compressed, inline)):
+                totals[index] += value
+            self.stdout.write(f'{url:32} {len(html):8} {compressed:8} {inline:11} {linked:10}')
+
+        self.stdout.write(f'{"Total":32} {totals[0]:8} {totals[1]:8} {totals[2]:11} {sum(stylesheets.values()):10}')
+        self.stdout.write('CSS files are counted once in the total: browsers cache them across pages.')
+
+    def get_user(self, username, role):
+        user = User.objects.filter(username=username).first() or User.objects.filter(role=role).first()
+        if user is None:
+            raise CommandError(f'No user with role {role} to render pages as')
+        return user
+
+    def fetch(self, user, url):
+        client = Client(HTTP_HOST='localhost')
+        if user:
+            client.force_login(user)
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} answered {response.status_code}')
+        return response.content
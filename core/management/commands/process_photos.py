@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.images import claim_next_photo
+from core.models import TaskPhoto
+from core.workers import process_photo, serve_queue
+
+
+class Command(BaseCommand):
+    help = 'Resizes and recompresses uploaded task photos in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'PHOTO_WORKERS', 2))
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between queue checks')
+        parser.add_argument('--once', action='store_true', help='Exit once the backlog is drained')
+        parser.add_argument('--retry-failed', action='store_true', help='Re-queue photos that failed before')
+        parser.add_argument('--reprocess', action='store_true',
+                            help='Re-queue every photo, e.g. to add a new rendition size. Uploaded '
+                                 'originals are not kept, so this re-encodes the stored, already '
+                                 'compressed images and cannot restore detail')
+        parser.add_argument('--stale-minutes', type=int, default=15,
+                            help='Re-queue photos stuck in PROCESSING longer than this (e.g. after a crash)')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        photos = TaskPhoto.objects.all()
+
+        if options['reprocess']:
+            requeue = photos.exclude(processing_status=TaskPhoto.PROCESSING_RUNNING)
+        elif options['retry_failed']:
+            requeue = photos.filter(processing_status=TaskPhoto.PROCESSING_FAILED)
+        else:
+            requeue = photos.none()
+        stale_before = timezone.now() - timedelta(minutes=options['stale_minutes'])
+        stale = photos.filter(processing_status=TaskPhoto.PROCESSING_RUNNING, processing_started_at__lt=stale_before)
+
+        requeued = (requeue | stale).update(processing_status=TaskPhoto.PROCESSING_PENDING, processing_error='')
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Re-queued {requeued} photo(s)'))
+
+        pending = photos.filter(processing_status=TaskPhoto.PROCESSING_PENDING).count()
+        self.stdout.write(f'Photo worker started with {workers} process(es), {pending} photo(s) pending')
+        serve_queue(claim_next_photo, process_photo, self.report, workers, options['poll_interval'], once=options['once'])
+
+    def report(self, photo_id, status, error):
+        if error is not None:
+            TaskPhoto.objects.filter(pk=photo_id).update(
+                processing_status=TaskPhoto.PROCESSING_FAILED, processing_error=str(error),
+            )
+            self.stdout.write(self.style.ERROR(f'Photo #{photo_id} crashed: {error}'))
+        elif status == TaskPhoto.PROCESSING_FAILED:
+            self.stdout.write(self.style.ERROR(f'Photo #{photo_id} failed'))
+        else:
+            self.stdout.write(f'Photo #{photo_id} processed')
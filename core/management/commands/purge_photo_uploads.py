@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import PhotoUpload
+from core.uploads import temp_path
+
+
+class Command(BaseCommand):
+    help = 'Deletes photo uploads that were never used by a task completion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=72,
+                            help='Delete uploads started longer ago than this')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        abandoned = PhotoUpload.objects.filter(created_at__lt=cutoff)
+
+        count = 0
+        for upload in abandoned.iterator():
+            count += 1
+            if options['dry_run']:
+                continue
+            upload.file.delete(save=False)
+            temp_path(upload).unlink(missing_ok=True)
+            upload.delete()
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {count} abandoned upload(s)'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.rollups import rebuild_daily_stats
+from core.stats import invalidate_task_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the DailyTaskStats rollup from tasks, items and location logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD); default: the earliest')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD); default: the latest')
+
+    def handle(self, *args, **options):
+        start, end = self.parse(options['start']), self.parse(options['end'])
+        if start and end and start > end:
+            raise CommandError('--start is after --end')
+        rows = rebuild_daily_stats(start, end)
+        # Only reaches the web workers' cards when CACHES is shared with them.
+        invalidate_task_stats()
+        span = f'{start or "the beginning"} to {end or "today"}'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} rollup row(s) from {span}'))
+
+    def parse(self, value):
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise CommandError(f'Not a date: {value}')
+        return day
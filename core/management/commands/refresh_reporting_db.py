@@ -0,0 +1,41 @@
+import os
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.routers import REPORTING_DB, reporting_configured
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the SQLite reporting snapshot from the default database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1024,
+                            help='Database pages copied per step of the online backup')
+        parser.add_argument('--sleep', type=float, default=0.01,
+                            help='Seconds to pause between steps so writers can get in')
+
+    def handle(self, *args, **options):
+        if not reporting_configured():
+            raise CommandError(f'No "{REPORTING_DB}" database is configured; set REPORTING_DB_NAME')
+        source = connections[DEFAULT_DB_ALIAS]
+        snapshot = connections[REPORTING_DB]
+        if source.vendor != 'sqlite' or snapshot.vendor != 'sqlite':
+            raise CommandError('Only SQLite snapshots can be refreshed; a replica is kept current by its server')
+
+        name = str(snapshot.settings_dict['NAME'])
+        if os.path.abspath(name) == os.path.abspath(str(source.settings_dict['NAME'])):
+            raise CommandError('The reporting database is the default database')
+
+        # Copied in place rather than swapped in, so the web processes'
+        # persistent connections see the new data. The copy lands in one
+        # transaction: readers get either the old snapshot or the new one.
+        source.ensure_connection()
+        target = sqlite3.connect(name, timeout=30)
+        try:
+            source.connection.backup(target, pages=options['pages'], sleep=options['sleep'])
+            tasks = target.execute('SELECT COUNT(*) FROM core_task').fetchone()[0]
+        finally:
+            target.close()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed reporting snapshot "{name}" ({tasks} tasks)'))
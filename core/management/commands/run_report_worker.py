@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ReportJob
+from core.reports import claim_next_job
+from core.workers import run_report_job, serve_queue
+
+
+class Command(BaseCommand):
+    help = 'Renders queued PDF reports in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'REPORT_WORKERS', 2))
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between queue checks')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained')
+        parser.add_argument('--stale-minutes', type=int, default=30,
+                            help='Re-queue RUNNING jobs started longer ago than this (e.g. after a crash)')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+
+        stale_before = timezone.now() - timedelta(minutes=options['stale_minutes'])
+        requeued = ReportJob.objects.filter(
+            status=ReportJob.STATUS_RUNNING, started_at__lt=stale_before,
+        ).update(status=ReportJob.STATUS_PENDING)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Re-queued {requeued} stale report job(s)'))
+
+        self.stdout.write(f'Report worker started with {workers} process(es)')
+        serve_queue(claim_next_job, run_report_job, self.report, workers, poll_interval, once=options['once'])
+
+    def report(self, job_id, status, error):
+        if error is not None:
+            ReportJob.objects.filter(pk=job_id).update(
+                status=ReportJob.STATUS_FAILED, error=str(error), finished_at=timezone.now(),
+            )
+            self.stdout.write(self.style.ERROR(f'Report #{job_id} crashed: {error}'))
+        else:
+            self.stdout.write(f'Report #{job_id} {status.lower()}')
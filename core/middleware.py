@@ -1,4 +1,88 @@
-from django.utils.cache import add_never_cache_headers
+import logging
+import mimetypes
+import os
+import posixpath
+from contextlib import ExitStack
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import add_never_cache_headers, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .routers import pin_reads_to_primary, reporting_configured
+
+logger = logging.getLogger(__name__)
+
+# Hashed static names never change content.
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+STATIC_MAX_AGE = 60 * 60
+
+
+class StaticFilesMiddleware:
+    """Serve ``STATIC_ROOT`` (after ``collectstatic``) when Django faces clients directly.
+
+    Names from the staticfiles manifest carry a content hash and are sent
+    with a one year ``immutable`` lifetime; other files are revalidated
+    after an hour. The ``.br``/``.gz`` copies written by
+    :class:`core.staticfiles.CompressedManifestStaticFilesStorage` are sent
+    to clients that accept them. Belongs right after SecurityMiddleware so
+    asset requests skip sessions and auth. Where a web server sits in front,
+    let it serve ``STATIC_ROOT`` with the same headers instead.
+    """
+    encodings = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + urlsplit(settings.STATIC_URL).path.strip('/') + '/'
+        self.root = settings.STATIC_ROOT
+        self.hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and self.root and request.path_info.startswith(self.prefix):
+            response = self.serve(request, request.path_info[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        name = posixpath.normpath(unquote(name)).lstrip('/')
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        immutable = name in self.hashed
+        if not immutable and not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+            return HttpResponseNotModified()
+
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        accepted = request.headers.get('Accept-Encoding', '')
+        encoding = None
+        for candidate, suffix in self.encodings:
+            if candidate in accepted and os.path.isfile(path + suffix):
+                encoding, path = candidate, path + suffix
+                break
+
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ['Accept-Encoding'])
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if immutable:
+            patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=STATIC_MAX_AGE)
+        return response
+
 
 class DisableBrowserCacheMiddleware:
     def __init__(self, get_response):
@@ -9,8 +93,68 @@ class DisableBrowserCacheMiddleware:
         
         # Only disable cache for authenticated users to ensure security
         # but allow public pages to be cached if needed.
-        # Alternatively, disable for everything if privacy is paramount.
-        if request.user.is_authenticated:
+        # Views that set their own Cache-Control (e.g. private, revalidated
+        # JSON with an ETag) have opted in to browser caching and are left alone.
+        if request.user.is_authenticated and not response.has_header('Cache-Control'):
             add_never_cache_headers(response)
         
         return response
+
+class ReadYourWritesMiddleware:
+    """After an admin's write, serve their reads from default for a while.
+
+    Reporting views otherwise read from a replica or snapshot that may not
+    have the change yet. Drivers never use those views, so their frequent
+    API posts leave the session alone.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            request.method not in ('GET', 'HEAD', 'OPTIONS')
+            and response.status_code < 400
+            and request.user.is_authenticated
+            and (request.user.is_admin() or request.user.is_superuser)
+            and reporting_configured()
+        ):
+            pin_reads_to_primary(request)
+        return response
+
+class QueryBudgetMiddleware:
+    """In DEBUG, warn when a request runs more queries than its budget.
+
+    The budget is ``settings.QUERY_BUDGET`` unless the view class sets a
+    ``query_budget`` attribute. Queries run while a streaming response is
+    being consumed are not counted.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DEBUG:
+            return self.get_response(request)
+
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        if match is not None:
+            view = getattr(match.func, 'view_class', match.func)
+            budget = getattr(view, 'query_budget', getattr(settings, 'QUERY_BUDGET', 15))
+            if count > budget:
+                logger.warning(
+                    "%s.%s ran %d queries for %s (budget %d)",
+                    view.__module__, view.__qualname__, count, request.path, budget,
+                )
+        return response
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskphoto',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='taskphoto',
+            name='preview',
+            field=models.ImageField(blank=True, upload_to='task_photos/renditions/%Y/%m/%d/'),
+        ),
+        migrations.AddField(
+            model_name='taskphoto',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='task_photos/renditions/%Y/%m/%d/'),
+        ),
+        migrations.AddField(
+            model_name='taskphoto',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='taskphoto',
+            name='image',
+            field=models.ImageField(height_field='height', upload_to='task_photos/%Y/%m/%d/', width_field='width'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_taskphoto_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskphoto',
+            name='processing_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='taskphoto',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='taskphoto',
+            name='processing_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='taskphoto',
+            index=models.Index(condition=models.Q(('processing_status', 'PENDING')), fields=['id'], name='taskphoto_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.9 on 2026-10-17 22:57
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_complete(apps, schema_editor):
+    # Uploads stored before chunking arrived whole.
+    PhotoUpload = apps.get_model('core', 'PhotoUpload')
+    PhotoUpload.objects.exclude(file='').update(completed_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_offline_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photoupload',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='photoupload',
+            name='filename',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='photoupload',
+            name='offset',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='photoupload',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='photoupload',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='photoupload',
+            name='file',
+            field=models.ImageField(blank=True, upload_to='photo_uploads/%Y/%m/%d/'),
+        ),
+        migrations.RunPython(mark_existing_complete, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:00
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_photoupload_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskphoto',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='taskphoto',
+            name='image',
+            field=core.storage.ContentAddressedImageField(hash_field='content_hash', height_field='height', storage=core.storage.photo_storage, upload_to='task_photos/%Y/%m/%d/', width_field='width'),
+        ),
+        migrations.AlterField(
+            model_name='taskphoto',
+            name='preview',
+            field=models.ImageField(blank=True, storage=core.storage.photo_storage, upload_to='task_photos/renditions/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='taskphoto',
+            name='thumbnail',
+            field=models.ImageField(blank=True, storage=core.storage.photo_storage, upload_to='task_photos/renditions/%Y/%m/%d/'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-17 23:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_rollup(apps, schema_editor):
+    from core.rollups import rebuild_daily_stats
+    rebuild_daily_stats(using=schema_editor.connection.alias, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_taskphoto_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTaskStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('ASSIGNED', 'Assigned'), ('IN_PROGRESS', 'In Progress'), ('COMPLETED', 'Completed'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('category', models.CharField(choices=[('FURNITURE', 'Furniture'), ('CLOTHES', 'Clothes'), ('ELECTRONICS', 'Electronics'), ('FOOD', 'Food'), ('BOOKS', 'Books'), ('OTHER', 'Other')], max_length=50)),
+                ('tasks', models.PositiveIntegerField(default=0)),
+                ('urgent', models.PositiveIntegerField(default=0)),
+                ('items', models.PositiveIntegerField(default=0, help_text='Sum of collected item quantities')),
+                ('timed_tasks', models.PositiveIntegerField(default=0)),
+                ('duration_seconds', models.FloatField(default=0)),
+                ('driver', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_task_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailytaskstats',
+            constraint=models.UniqueConstraint(fields=('day', 'status', 'category', 'driver'), name='daily_task_stats_group'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailytaskstats',
+            constraint=models.UniqueConstraint(condition=models.Q(('driver__isnull', True)), fields=('day', 'status', 'category'), name='daily_task_stats_unassigned_group'),
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+from .storage import ContentAddressedImageField, photo_storage
 
 class User(AbstractUser):
     ROLE_ADMIN = 'ADMIN'
@@ -58,10 +60,59 @@ class Task(models.Model):
     # New fields based on completion form
     visitor_form_filled = models.BooleanField(default=False)
     trust_notice_given = models.BooleanField(default=False)
+    # Client-generated key of the offline submission that completed the task;
+    # replaying the same submission is then answered instead of re-applied.
+    completion_key = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        # Cover the list/history/export/report filters and orderings.
+        indexes = [
+            models.Index(fields=['status', 'id'], name='task_status_id_idx'),
+            models.Index(fields=['status', 'created_at'], name='task_status_created_idx'),
+            models.Index(fields=['created_at'], name='task_created_idx'),
+            models.Index(fields=['id'], condition=models.Q(is_urgent=True), name='task_urgent_idx'),
+            # Open tasks only; also serves the driver dashboard, whose
+            # assigned_to/is_broadcast OR cannot use a multi-index plan.
+            models.Index(fields=['id'], condition=~models.Q(status='COMPLETED'), name='task_open_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored status, so save signals can tell a change from a re-save.
+        instance._saved_status = instance.__dict__.get('status')
+        return instance
 
     def __str__(self):
         return f"{self.donor_name} - {self.status}- {self.qty }"
 
+    def claim(self, driver):
+        """Take this broadcast task for ``driver`` and start it.
+
+        Runs as one conditional UPDATE, so when several drivers claim at once
+        exactly one of them wins. Returns False if the task was no longer open.
+        """
+        from .events import TASK_CLAIMED, publish_task_event
+        from .rollups import schedule_refresh
+        from .stats import invalidate_task_stats
+
+        now = timezone.now()
+        claimed = type(self)._default_manager.using(self._state.db).filter(
+            pk=self.pk, is_broadcast=True, status=self.STATUS_ASSIGNED,
+        ).update(is_broadcast=False, assigned_to=driver, status=self.STATUS_IN_PROGRESS, updated_at=now)
+        if not claimed:
+            return False
+
+        # update() bypasses the save signals that normally expire the stats.
+        transaction.on_commit(invalidate_task_stats, using=self._state.db)
+        schedule_refresh(timezone.localdate(self.created_at), using=self._state.db)
+        self.is_broadcast = False
+        self.assigned_to = driver
+        self.status = self.STATUS_IN_PROGRESS
+        self.updated_at = now
+        publish_task_event(TASK_CLAIMED, self)
+        return True
+
 class Item(models.Model):
     CONDITION_GOOD = 'GOOD'
     CONDITION_AVERAGE = 'AVERAGE'
@@ -93,10 +144,56 @@ class TaskPhoto(models.Model):
     ]
 
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='photos')
-    image = models.ImageField(upload_to='task_photos/%Y/%m/%d/')
+    # Stored content-addressed (see core.storage): identical photos share one
+    # file, and content_hash names the blob this row references.
+    image = ContentAddressedImageField(
+        upload_to='task_photos/%Y/%m/%d/', width_field='width', height_field='height', hash_field='content_hash',
+    )
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
     photo_type = models.CharField(max_length=20, choices=PHOTO_TYPE_CHOICES, default=PHOTO_TYPE_ITEM)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    # Downscaled renditions generated from the original by the photo worker
+    # (see core.images and the process_photos command).
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail = models.ImageField(upload_to='task_photos/renditions/%Y/%m/%d/', storage=photo_storage, blank=True)
+    preview = models.ImageField(upload_to='task_photos/renditions/%Y/%m/%d/', storage=photo_storage, blank=True)
+
+    PROCESSING_PENDING = 'PENDING'
+    PROCESSING_RUNNING = 'PROCESSING'
+    PROCESSING_DONE = 'DONE'
+    PROCESSING_FAILED = 'FAILED'
+    PROCESSING_CHOICES = [
+        (PROCESSING_PENDING, 'Pending'),
+        (PROCESSING_RUNNING, 'Processing'),
+        (PROCESSING_DONE, 'Done'),
+        (PROCESSING_FAILED, 'Failed'),
+    ]
+    processing_status = models.CharField(max_length=20, choices=PROCESSING_CHOICES, default=PROCESSING_PENDING)
+    processing_started_at = models.DateTimeField(null=True, blank=True)
+    processing_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(processing_status='PENDING'), name='taskphoto_pending_idx'),
+        ]
+
+    @property
+    def srcset(self):
+        """``srcset`` value listing each stored rendition with its pixel width."""
+        from .images import RENDITIONS
+        if not (self.thumbnail and self.width and self.height):
+            return ''
+        longest = max(self.width, self.height)
+        candidates = [
+            (getattr(self, field).url, round(self.width * min(1, size / longest)))
+            for field, size in RENDITIONS.items()
+            if getattr(self, field)
+        ]
+        candidates.append((self.image.url, self.width))
+        return ', '.join(f'{url} {width}w' for url, width in candidates)
+
 class LocationLog(models.Model):
     EVENT_START = 'START'
     EVENT_COMPLETE = 'COMPLETE'
@@ -110,3 +207,112 @@ class LocationLog(models.Model):
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     event = models.CharField(max_length=20, choices=EVENT_CHOICES)
     timestamp = models.DateTimeField(auto_now_add=True)
+
+class PhotoUpload(models.Model):
+    """A completion photo received ahead of the completion itself.
+
+    Offline submissions upload each photo separately under a client-generated
+    key, in chunks appended at ``offset`` (see core.uploads), so a retry only
+    re-sends what the server does not have yet. Once all ``size`` bytes are in
+    and match ``sha256`` the file moves to storage; the completion then turns
+    the uploads it references into TaskPhotos.
+    """
+    key = models.UUIDField(unique=True)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='uploads')
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='photo_uploads')
+    slot = models.PositiveSmallIntegerField()
+    filename = models.CharField(max_length=255, blank=True)
+    size = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    offset = models.PositiveBigIntegerField(default=0)
+    file = models.ImageField(upload_to='photo_uploads/%Y/%m/%d/', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Upload {self.key} for task #{self.task_id}"
+
+def report_storage():
+    # Reports hold donor details, so they live outside MEDIA_ROOT and are only
+    # handed out through the admin-only download view.
+    from django.conf import settings
+    from django.core.files.storage import FileSystemStorage
+    return FileSystemStorage(location=settings.REPORTS_ROOT)
+
+class ReportJob(models.Model):
+    STATUS_PENDING = 'PENDING'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_DONE = 'DONE'
+    STATUS_FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    params = models.JSONField(default=dict)
+    params_hash = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    progress = models.PositiveSmallIntegerField(default=0)
+    file = models.FileField(upload_to='task_reports/%Y/%m/%d/', storage=report_storage, blank=True)
+    error = models.TextField(blank=True)
+
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # At most one queued/running job per filter set; identical requests share it.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['params_hash'],
+                condition=models.Q(status__in=['PENDING', 'RUNNING']),
+                name='unique_active_report_job',
+            ),
+        ]
+
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def __str__(self):
+        return f"Report #{self.pk} - {self.status}"
+
+
+class DailyTaskStats(models.Model):
+    """Tasks rolled up per creation day, status, category and driver.
+
+    Maintained by ``core.rollups`` whenever a task, its items or its location
+    logs change; ``manage.py rebuild_task_stats`` recomputes any date range.
+    Aggregates read these rows, one per group and day, instead of every task.
+    """
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES)
+    category = models.CharField(max_length=50, choices=Task.CATEGORY_CHOICES)
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='daily_task_stats')
+
+    tasks = models.PositiveIntegerField(default=0)
+    urgent = models.PositiveIntegerField(default=0)
+    items = models.PositiveIntegerField(default=0, help_text="Sum of collected item quantities")
+    # Start -> complete time, from the tasks' START and COMPLETE location logs.
+    timed_tasks = models.PositiveIntegerField(default=0)
+    duration_seconds = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status', 'category', 'driver'], name='daily_task_stats_group'),
+            # NULLs are distinct in a unique index: unassigned tasks need their own.
+            models.UniqueConstraint(
+                fields=['day', 'status', 'category'],
+                condition=models.Q(driver__isnull=True),
+                name='daily_task_stats_unassigned_group',
+            ),
+        ]
+
+    @property
+    def mean_duration(self):
+        return self.duration_seconds / self.timed_tasks if self.timed_tasks else None
+
+    def __str__(self):
+        return f"{self.day} {self.status} {self.category}: {self.tasks}"
@@ -0,0 +1,124 @@
+import hashlib
+
+from django.core.cache import cache
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+# Cursor values are primary keys, which SQLite stores as signed 64-bit integers.
+MAX_CURSOR_VALUE = 2 ** 63 - 1
+
+
+def encode_cursor(direction, value):
+    return urlsafe_base64_encode(f'{direction}:{value}'.encode())
+
+
+def decode_cursor(token):
+    """Return ``(direction, value)`` for a cursor token, or ``None`` if it is invalid."""
+    if not token:
+        return None
+    try:
+        direction, value = force_str(urlsafe_base64_decode(token)).split(':', 1)
+        value = int(value)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not 1 <= value <= MAX_CURSOR_VALUE:
+        return None
+    return direction, value
+
+
+class KeysetPage:
+    """The slice of a keyset-paginated list, exposing the cursors around it."""
+
+    def __init__(self, object_list, request, cursor_field, has_next, has_previous, approximate_total=None):
+        self.object_list = object_list
+        self.request = request
+        self.cursor_field = cursor_field
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.approximate_total = approximate_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def start_key(self):
+        return getattr(self.object_list[0], self.cursor_field) if self.object_list else None
+
+    @property
+    def end_key(self):
+        return getattr(self.object_list[-1], self.cursor_field) if self.object_list else None
+
+    def _querystring(self, direction, obj):
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params['cursor'] = encode_cursor(direction, getattr(obj, self.cursor_field))
+        return params.urlencode()
+
+    @property
+    def next_querystring(self):
+        if self._has_next and self.object_list:
+            return self._querystring(NEXT, self.object_list[-1])
+        return ''
+
+    @property
+    def previous_querystring(self):
+        if self._has_previous and self.object_list:
+            return self._querystring(PREVIOUS, self.object_list[0])
+        return ''
+
+
+class KeysetPaginationMixin:
+    """Cursor pagination for ListViews ordered by an ascending unique column.
+
+    Each page is fetched with ``WHERE cursor_field > last`` (or ``<`` when going
+    back) and ``LIMIT page_size + 1``, so no COUNT(*) or OFFSET is needed and the
+    cost of a page does not depend on how deep it is.
+    """
+
+    cursor_field = 'id'
+    cursor_kwarg = 'cursor'
+    # Seconds to cache an approximate total; ``None`` disables the total.
+    approximate_total_timeout = None
+
+    def get_approximate_total(self, queryset):
+        if self.approximate_total_timeout is None:
+            return None
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}{params}'.encode(), usedforsecurity=False).hexdigest()
+        return cache.get_or_set(f'keyset_total:{digest}', queryset.count, self.approximate_total_timeout)
+
+    def paginate_queryset(self, queryset, page_size):
+        field = self.cursor_field
+        cursor = decode_cursor(self.request.GET.get(self.cursor_kwarg))
+        approximate_total = self.get_approximate_total(queryset)
+
+        if cursor and cursor[0] == PREVIOUS:
+            rows = list(queryset.filter(**{f'{field}__lt': cursor[1]}).order_by(f'-{field}')[:page_size + 1])
+            has_previous = len(rows) > page_size
+            object_list = rows[:page_size][::-1]
+            has_next = True
+        else:
+            if cursor:
+                queryset = queryset.filter(**{f'{field}__gt': cursor[1]})
+            rows = list(queryset.order_by(field)[:page_size + 1])
+            has_next = len(rows) > page_size
+            object_list = rows[:page_size]
+            has_previous = cursor is not None
+
+        page = KeysetPage(object_list, self.request, field, has_next, has_previous, approximate_total)
+        return None, page, object_list, page.has_other_pages()
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import math
+import tempfile
+from contextlib import nullcontext
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from django.template.loader import get_template
+from django.utils import timezone
+from pypdf import PdfReader, PdfWriter
+from reportlab.lib.colors import HexColor
+from reportlab.lib.units import cm
+from reportlab.pdfgen.canvas import Canvas
+from xhtml2pdf import pisa
+
+from .filters import DateRangeFilter
+from .models import ReportJob, Task
+from .routers import reporting_reads
+
+REPORT_PARAMS = ('status', 'filter', 'start_date', 'end_date')
+# Set on jobs whose requester must see their own recent writes: rendered
+# from default instead of the reporting database.
+PRIMARY_PARAM = 'read_primary'
+# Rows rendered per HTML -> PDF pass; bounds peak memory for large ranges.
+REPORT_CHUNK_SIZE = getattr(settings, 'REPORT_CHUNK_SIZE', 500)
+# Rendered PDFs no job has used for this long are deleted.
+REPORT_CACHE_MAX_AGE = getattr(settings, 'REPORT_CACHE_MAX_AGE', timedelta(days=7))
+
+
+class ReportError(Exception):
+    pass
+
+
+def normalise_params(query):
+    """Reduce request parameters to the canonical filter set a report depends on."""
+    params = {}
+    for key in REPORT_PARAMS:
+        value = (query.get(key) or '').strip()
+        if value:
+            params[key] = value
+    date_range = DateRangeFilter(params.pop('start_date', None), params.pop('end_date', None))
+    if date_range.start_date:
+        params['start_date'] = date_range.start_date.isoformat()
+    if date_range.end_date:
+        params['end_date'] = date_range.end_date.isoformat()
+    return params
+
+
+def params_hash(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def report_queryset(params):
+    tasks = Task.objects.all().select_related('assigned_to')
+
+    status = params.get('status')
+    if status:
+        tasks = tasks.filter(status=status)
+
+    tasks = DateRangeFilter(params.get('start_date'), params.get('end_date')).apply(tasks)
+
+    filter_type = params.get('filter')
+    if filter_type == 'pending':
+        tasks = tasks.exclude(status='COMPLETED')
+    elif filter_type == 'urgent':
+        tasks = tasks.filter(is_urgent=True)
+    elif filter_type == 'completed':
+        tasks = tasks.filter(status='COMPLETED')
+
+    return tasks.order_by('id')
+
+
+def report_fingerprint(params):
+    """Hash of the filters plus the state of the matching rows.
+
+    Counted per driver: any edit bumps ``updated_at``, any insert or delete
+    changes a count, and a deleted driver's tasks (unassigned by an UPDATE
+    that leaves ``updated_at`` alone) or a renamed driver move to another
+    group. An unchanged fingerprint means the rendered PDF is still current.
+    """
+    groups = report_queryset(params).values_list('assigned_to_id', 'assigned_to__username').annotate(
+        count=Count('id'), last_updated=Max('updated_at'),
+    ).order_by('assigned_to_id')
+    payload = {
+        'params': params,
+        'drivers': [
+            [driver_id, username, count, last_updated.isoformat()]
+            for driver_id, username, count, last_updated in groups
+        ],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def cache_name(fingerprint):
+    return f'cache/{fingerprint[:2]}/{fingerprint}.pdf'
+
+
+def report_storage():
+    return ReportJob._meta.get_field('file').storage
+
+
+def cached_report(params):
+    """Return the storage name of an up-to-date rendered report, if there is one."""
+    name = cache_name(report_fingerprint(params))
+    return name if report_storage().exists(name) else None
+
+
+def iter_chunks(queryset, size):
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+
+def render_report(params, dest, progress=None):
+    """Write the PDF report for ``params`` into the file-like ``dest``.
+
+    Rows are rendered ``REPORT_CHUNK_SIZE`` at a time into separate PDFs that
+    are then merged, so only one chunk's HTML is held in memory at once.
+    """
+    tasks = report_queryset(params)
+    total = tasks.count()
+    parts = max(1, math.ceil(total / REPORT_CHUNK_SIZE))
+    template = get_template('core/task_list_pdf.html')
+    context = {
+        'start_date': params.get('start_date'),
+        'end_date': params.get('end_date'),
+        'status': params.get('status'),
+        'filter_type': params.get('filter'),
+        'generated_at': timezone.now(),
+    }
+
+    writer = PdfWriter()
+    chunks = iter_chunks(tasks, REPORT_CHUNK_SIZE) if total else [[]]
+    for part, chunk in enumerate(chunks, start=1):
+        html = template.render({**context, 'tasks': chunk, 'part': part})
+        buffer = BytesIO()
+        pisa_status = pisa.CreatePDF(html, dest=buffer)
+        if pisa_status.err:
+            raise ReportError(f'PDF conversion of part {part} failed with {pisa_status.err} error(s)')
+        writer.append(buffer)
+        if progress:
+            progress(min(99, part * 100 // parts))
+    number_pages(writer)
+    writer.write(dest)
+
+
+def number_pages(writer):
+    """Stamp "Page n of total" on the merged report; each part only knows its own pages."""
+    total = len(writer.pages)
+    for number, page in enumerate(writer.pages, start=1):
+        width, height = float(page.mediabox.width), float(page.mediabox.height)
+        overlay = BytesIO()
+        canvas = Canvas(overlay, pagesize=(width, height))
+        canvas.setFont('Helvetica', 8)
+        canvas.setFillColor(HexColor('#94a3b8'))
+        canvas.drawCentredString(width / 2, 1.2 * cm, f'Page {number} of {total}')
+        canvas.save()
+        page.merge_page(PdfReader(overlay).pages[0])
+
+
+def prune_report_cache(max_age=REPORT_CACHE_MAX_AGE):
+    """Delete finished jobs and rendered PDFs older than ``max_age``. Returns the PDFs deleted.
+
+    A PDF is kept while a remaining job points at it, since reused renders
+    are not rewritten and so keep their original modification time.
+    """
+    cutoff = timezone.now() - max_age
+    ReportJob.objects.filter(
+        status__in=[ReportJob.STATUS_DONE, ReportJob.STATUS_FAILED], finished_at__lt=cutoff,
+    ).delete()
+    in_use = set(ReportJob.objects.exclude(file='').values_list('file', flat=True))
+    storage = report_storage()
+    if not storage.exists('cache'):
+        return 0
+    deleted = 0
+    for directory in storage.listdir('cache')[0]:
+        for filename in storage.listdir(f'cache/{directory}')[1]:
+            name = f'cache/{directory}/{filename}'
+            if name not in in_use and storage.get_modified_time(name) < cutoff:
+                storage.delete(name)
+                deleted += 1
+    return deleted
+
+
+def request_report(params, user=None):
+    """Queue a report for ``params``, reusing an identical job that is still pending or running."""
+    digest = params_hash(params)
+    active = ReportJob.objects.filter(
+        params_hash=digest, status__in=[ReportJob.STATUS_PENDING, ReportJob.STATUS_RUNNING],
+    )
+    job = active.first()
+    if job is not None:
+        return job
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(params=params, params_hash=digest, requested_by=user)
+    except IntegrityError:
+        # Lost the race to a concurrent identical request; share its job.
+        return active.get()
+
+
+def claim_next_job():
+    """Atomically move the oldest pending job to RUNNING and return its id."""
+    pending = ReportJob.objects.filter(status=ReportJob.STATUS_PENDING).order_by('id')
+    for job_id in pending.values_list('id', flat=True)[:10]:
+        claimed = ReportJob.objects.filter(pk=job_id, status=ReportJob.STATUS_PENDING).update(
+            status=ReportJob.STATUS_RUNNING, started_at=timezone.now(), progress=0,
+        )
+        if claimed:
+            return job_id
+    return None
+
+
+def run_report_job(job_id):
+    """Render a claimed job and store the result. Runs inside a worker process."""
+    job = ReportJob.objects.get(pk=job_id)
+
+    def progress(percent):
+        ReportJob.objects.filter(pk=job_id).update(progress=percent)
+
+    reads = nullcontext() if job.params.get(PRIMARY_PARAM) else reporting_reads()
+    rendered = False
+    try:
+        # Reports are stored content-addressed, so an identical render that
+        # finished in the meantime is reused instead of being written again.
+        with reads:
+            name = cache_name(report_fingerprint(job.params))
+            storage = report_storage()
+            if not storage.exists(name):
+                with tempfile.TemporaryFile() as output:
+                    render_report(job.params, output, progress=progress)
+                    output.seek(0)
+                    name = storage.save(name, File(output))
+                rendered = True
+        job.file.name = name
+    except Exception as exc:
+        job.status = ReportJob.STATUS_FAILED
+        job.error = str(exc)
+    else:
+        job.status = ReportJob.STATUS_DONE
+        job.progress = 100
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'progress', 'error', 'finished_at'])
+    if rendered:
+        # Every data change leaves a new PDF; drop the ones nobody uses any more.
+        prune_report_cache()
+    return job.status
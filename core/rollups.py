@@ -0,0 +1,97 @@
+import threading
+from collections import defaultdict
+
+from django.apps import apps as global_apps
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .filters import DateRangeFilter
+from .models import LocationLog, Task
+from .stats import invalidate_task_stats
+
+# Per database: days and tasks changed in the current transaction, refreshed on commit.
+_pending = threading.local()
+
+
+def _task_rows(tasks, apps):
+    Item = apps.get_model('core', 'Item')
+    logs = apps.get_model('core', 'LocationLog')._default_manager.using(tasks.db)
+    started = logs.filter(
+        task=OuterRef('pk'), event=LocationLog.EVENT_START,
+    ).order_by('timestamp').values('timestamp')[:1]
+    completed = logs.filter(
+        task=OuterRef('pk'), event=LocationLog.EVENT_COMPLETE,
+    ).order_by('-timestamp').values('timestamp')[:1]
+    quantity = Item._default_manager.using(tasks.db).filter(task=OuterRef('pk')).values('task').annotate(total=Sum('quantity')).values('total')
+    return tasks.annotate(
+        day=TruncDate('created_at'),
+        item_quantity=Coalesce(Subquery(quantity, output_field=IntegerField()), 0),
+        started=Subquery(started),
+        completed=Subquery(completed),
+    ).values_list('day', 'status', 'category', 'assigned_to_id', 'is_urgent', 'item_quantity', 'started', 'completed')
+
+
+def rebuild_daily_stats(start=None, end=None, using=DEFAULT_DB_ALIAS, apps=global_apps):
+    """Recompute the rollup for the days ``start``..``end`` (inclusive; open when None).
+
+    Reads each task in the range once. Returns the number of rows written.
+    ``apps`` is where the models come from, so migrations can pass theirs.
+    """
+    DailyTaskStats = apps.get_model('core', 'DailyTaskStats')
+    tasks = DateRangeFilter(start, end).apply(apps.get_model('core', 'Task')._default_manager.using(using))
+    days = DailyTaskStats._default_manager.using(using)
+    if start:
+        days = days.filter(day__gte=start)
+    if end:
+        days = days.filter(day__lte=end)
+
+    # Read and write in one transaction (BEGIN IMMEDIATE takes the write
+    # lock first), so a concurrent refresh of the same day that read older
+    # data cannot commit after this one and overwrite it.
+    with transaction.atomic(using=using):
+        groups = defaultdict(DailyTaskStats)
+        for day, status, category, driver_id, urgent, quantity, started, completed in _task_rows(tasks, apps):
+            row = groups[day, status, category, driver_id]
+            row.day, row.status, row.category, row.driver_id = day, status, category, driver_id
+            row.tasks += 1
+            row.urgent += urgent
+            row.items += quantity
+            if started and completed and completed >= started:
+                row.timed_tasks += 1
+                row.duration_seconds += (completed - started).total_seconds()
+        days.delete()
+        DailyTaskStats._default_manager.using(using).bulk_create(groups.values())
+    return len(groups)
+
+
+def refresh_pending(using=DEFAULT_DB_ALIAS):
+    pending = _pending.__dict__.pop(using, None)
+    if pending is None:
+        return
+    days = pending['days']
+    if pending['task_ids']:
+        created = Task.objects.using(using).filter(pk__in=pending['task_ids']).values_list('created_at', flat=True)
+        days.update(timezone.localdate(value) for value in created)
+    for day in sorted(days):
+        rebuild_daily_stats(day, day, using=using)
+    if days:
+        # Stat cards cached between the write and this refresh are stale.
+        invalidate_task_stats()
+
+
+def schedule_refresh(day=None, task_id=None, using=DEFAULT_DB_ALIAS):
+    """Refresh the rollup for ``day`` (or ``task_id``'s day) once the transaction commits.
+
+    A task's rows only depend on that task's creation day, so a change is
+    applied by recomputing that single day. Several changes within one
+    transaction (a completion saves the task, its items and logs) share one
+    refresh.
+    """
+    pending = _pending.__dict__.setdefault(using, {'days': set(), 'task_ids': set()})
+    if day is not None:
+        pending['days'].add(day)
+    if task_id is not None:
+        pending['task_ids'].add(task_id)
+    transaction.on_commit(lambda: refresh_pending(using), using=using)
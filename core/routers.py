@@ -0,0 +1,70 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPORTING_DB = 'reporting'
+# Task data the reports read. Bookkeeping such as ReportJob, sessions and
+# the cache must be current, so it is always read from default.
+REPORTING_MODELS = {
+    'core.task', 'core.item', 'core.taskphoto', 'core.locationlog', 'core.user', 'core.dailytaskstats',
+}
+# Session key: reads stay on default until this time after a write.
+STICKY_UNTIL_KEY = 'read_primary_until'
+
+_reporting_reads = ContextVar('reporting_reads', default=False)
+
+
+def reporting_configured():
+    return REPORTING_DB in connections.settings
+
+
+@contextmanager
+def reporting_reads():
+    """Send reads of ``REPORTING_MODELS`` to the reporting database, if there is one.
+
+    Querysets are routed when they are evaluated, so a response that is
+    streamed after the view returns should pin its querysets with ``using()``.
+    """
+    token = _reporting_reads.set(True)
+    try:
+        yield
+    finally:
+        _reporting_reads.reset(token)
+
+
+def pin_reads_to_primary(request):
+    """Keep ``request``'s user on default for long enough to read their own writes."""
+    request.session[STICKY_UNTIL_KEY] = time.time() + settings.REPORTING_STICKY_SECONDS
+
+
+def reads_pinned_to_primary(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(STICKY_UNTIL_KEY, 0) > time.time()
+
+
+class ReportingRouter:
+    """Routes reporting reads to the ``reporting`` alias and everything else to default.
+
+    ``reporting`` may be a replica or a snapshot refreshed by
+    ``manage.py refresh_reporting_db``. It is never written to or migrated.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _reporting_reads.get() and model._meta.label_lower in REPORTING_MODELS and reporting_configured():
+            return REPORTING_DB
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPORTING_DB:
+            return False
+        return None
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .events import TASK_CANCELLED, TASK_CREATED, publish_task_event
+from .models import Item, LocationLog, Task, User
+from .rollups import schedule_refresh
+from .stats import invalidate_task_stats
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def task_changed(sender, instance, using, **kwargs):
+    # Expiring before the commit would let another request cache the old
+    # numbers under the new generation.
+    transaction.on_commit(invalidate_task_stats, using=using)
+    schedule_refresh(timezone.localdate(instance.created_at), using=using)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=LocationLog)
+@receiver(post_delete, sender=LocationLog)
+def task_detail_changed(sender, instance, using, **kwargs):
+    schedule_refresh(task_id=instance.task_id, using=using)
+
+
+@receiver(pre_delete, sender=User)
+def driver_deleted(sender, instance, using, **kwargs):
+    # Their tasks become unassigned through an UPDATE that sends no signals.
+    for created in Task.objects.using(using).filter(assigned_to=instance).values_list('created_at', flat=True):
+        schedule_refresh(timezone.localdate(created), using=using)
+
+
+@receiver(post_save, sender=Task)
+def push_task_event(sender, instance, created, **kwargs):
+    if created:
+        publish_task_event(TASK_CREATED, instance)
+    elif instance.status == 'CANCELLED' and getattr(instance, '_saved_status', None) != 'CANCELLED':
+        publish_task_event(TASK_CANCELLED, instance)
+    instance._saved_status = instance.status
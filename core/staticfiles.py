@@ -0,0 +1,55 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+# Text formats worth compressing; fonts and images are compressed already.
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.txt', '.webmanifest', '.xml')
+MIN_COMPRESS_SIZE = 256
+
+
+def compressors():
+    """(suffix, compress) pairs for the pre-compressed copies to write.
+
+    Brotli copies need the optional ``brotli`` package; gzip ones are always written.
+    """
+    available = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        available.insert(0, ('.br', lambda data: brotli.compress(data, quality=11)))
+    return available
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes ``.br``/``.gz`` copies of hashed files.
+
+    Only the hashed names are compressed: those are what templates link to
+    once ``collectstatic`` has run. A copy is kept only if it is smaller
+    than the original. Served by :class:`core.middleware.StaticFilesMiddleware`.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.write_compressed(name)
+
+    def write_compressed(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            data = source.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for suffix, compress in compressors():
+            compressed_path = path + suffix
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                with open(compressed_path, 'wb') as target:
+                    target.write(compressed)
+            elif os.path.exists(compressed_path):
+                os.remove(compressed_path)
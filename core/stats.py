@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import DailyTaskStats, Task
+
+# Stat cards are recomputed at most once per timeout; saves and deletes on
+# Task bump the generation below once they commit. The generation lives in the
+# default cache, so it only reaches processes sharing that cache: with the
+# per-process LocMemCache, other workers (and changes made by management
+# commands) show up when their cached cards time out.
+STATS_CACHE_TIMEOUT = getattr(settings, 'TASK_STATS_CACHE_TIMEOUT', 300)
+GENERATION_KEY = 'task_stats:generation'
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(GENERATION_KEY, generation, None)
+    return generation
+
+
+def _cache_key(scope):
+    return f'task_stats:{_generation()}:{scope}'
+
+
+def compute_task_stats(queryset):
+    """Return every stat card count for ``queryset`` in a single query."""
+    active = [Task.STATUS_ASSIGNED, Task.STATUS_IN_PROGRESS]
+    return queryset.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=~Q(status=Task.STATUS_COMPLETED)),
+        urgent=Count('id', filter=Q(is_urgent=True, status__in=active)),
+        in_progress=Count('id', filter=Q(status=Task.STATUS_IN_PROGRESS)),
+        completed=Count('id', filter=Q(status=Task.STATUS_COMPLETED)),
+    )
+
+
+def compute_rollup_stats(queryset):
+    """The same counts as ``compute_task_stats``, summed from ``DailyTaskStats`` rows."""
+    active = [Task.STATUS_ASSIGNED, Task.STATUS_IN_PROGRESS]
+
+    def total(field, condition=None):
+        return Coalesce(Sum(field, filter=condition), 0)
+
+    return queryset.aggregate(
+        total=total('tasks'),
+        pending=total('tasks', ~Q(status=Task.STATUS_COMPLETED)),
+        urgent=total('urgent', Q(status__in=active)),
+        in_progress=total('tasks', Q(status=Task.STATUS_IN_PROGRESS)),
+        completed=total('tasks', Q(status=Task.STATUS_COMPLETED)),
+    )
+
+
+def _cached_stats(scope, queryset, compute=compute_task_stats):
+    key = _cache_key(scope)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute(queryset)
+        cache.set(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def get_global_stats():
+    # One row per day and group rather than one per task.
+    return _cached_stats('global', DailyTaskStats.objects.all(), compute_rollup_stats)
+
+
+def get_driver_stats(user):
+    # Broadcast tasks count towards every driver, matching DriverDashboardView.
+    queryset = Task.objects.filter(Q(assigned_to=user) | Q(is_broadcast=True))
+    return _cached_stats(f'driver:{user.pk}', queryset)
+
+
+def invalidate_task_stats():
+    # A broadcast task touches every driver's scope, so rather than tracking
+    # scopes individually we move all of them to a fresh generation at once.
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, _generation() + 1, None)
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import ImageField, ImageFieldFile
+
+BLOB_DIRECTORY = 'blobs'
+BLOB_NAME = re.compile(r'(?:^|/)' + BLOB_DIRECTORY + r'/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?:\.\w+)?$')
+
+
+def content_hash(name):
+    """The SHA-256 a content-addressed ``name`` was stored under, or ``''``."""
+    match = BLOB_NAME.search(name or '')
+    return match.group('digest') if match else ''
+
+
+def blob_name(name, digest):
+    # Keep the top-level directory of upload_to so media stays grouped by
+    # model, but drop the date folders: identical bytes map to one path.
+    root = name.split('/', 1)[0] if '/' in name else ''
+    extension = os.path.splitext(name)[1].lower()
+    return posixpath.join(root, BLOB_DIRECTORY, digest[:2], f'{digest}{extension}')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that keeps each distinct file once.
+
+    Content is hashed while it is streamed to a temporary file; the file is
+    then named after its SHA-256, and dropped if that blob is already stored.
+    Names can be shared by several rows, so blobs are not deleted when a row
+    lets go of one; ``images.prune_orphaned_blobs`` removes them later.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # _save() picks the final name; equal names mean equal content.
+        return name
+
+    def _save(self, name, content):
+        incoming = os.path.join(self.location, '.incoming')
+        os.makedirs(incoming, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=incoming, delete=False) as temp:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temp.write(chunk)
+
+        final_name = blob_name(name, digest.hexdigest())
+        full_path = self.path(final_name)
+        if os.path.exists(full_path):
+            os.remove(temp.name)
+            # Restart the blob's grace period: it may have been unreferenced
+            # until now, and the row that reuses it is not committed yet.
+            os.utime(full_path)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(temp.name, full_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+        return final_name
+
+    def digest(self, name):
+        digest = hashlib.sha256()
+        with self.open(name, 'rb') as stored:
+            for chunk in stored.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def ingest(self, name):
+        """Move an already stored, non-addressed file to its blob; return the blob name.
+
+        If the blob exists the file is left in place for the caller to delete
+        once nothing references it any more.
+        """
+        final_name = blob_name(name, self.digest(name))
+        full_path = self.path(final_name)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(self.path(name), full_path)
+        return final_name
+
+
+def photo_storage():
+    return ContentAddressedStorage()
+
+
+class ContentAddressedImageFieldFile(ImageFieldFile):
+    def save(self, name, content, save=True):
+        super().save(name, content, save=False)
+        if self.field.hash_field:
+            setattr(self.instance, self.field.hash_field, content_hash(self.name))
+        if save:
+            self.instance.save()
+
+
+class ContentAddressedImageField(ImageField):
+    """ImageField that records the stored blob's SHA-256 in ``hash_field``."""
+    attr_class = ContentAddressedImageFieldFile
+
+    def __init__(self, *args, hash_field=None, **kwargs):
+        self.hash_field = hash_field
+        kwargs.setdefault('storage', photo_storage)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.hash_field:
+            kwargs['hash_field'] = self.hash_field
+        return name, path, args, kwargs
@@ -1,3 +1,1538 @@
-from django.test import TestCase
+import asyncio
+import copy
+import gzip
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from pypdf import PdfReader
+
+from .events import TASK_CANCELLED, TASK_CREATED, TASKS_IMPORTED, get_broker, visible_to_driver
+from .filters import DateRangeFilter
+from .imports import import_tasks
+from .images import PRUNE_GRACE_SECONDS, claim_next_photo, process_photo, prune_orphaned_blobs
+from .models import DailyTaskStats, Item, LocationLog, PhotoUpload, ReportJob, Task, TaskPhoto, User
+from .pagination import NEXT, encode_cursor
+from .stats import compute_task_stats, get_driver_stats, get_global_stats
+from .storage import content_hash
+from .rollups import rebuild_daily_stats
+from .routers import REPORTING_DB, ReportingRouter, reporting_reads
+from .reports import (
+    PRIMARY_PARAM, claim_next_job, normalise_params, prune_report_cache, render_report, report_fingerprint,
+    request_report, run_report_job,
+)
+from . import uploads, urls as core_urls, views
+
+
+# No manifest exists until collectstatic has run, so tests serve unhashed names.
+UNHASHED_STATIC = override_settings(STORAGES={
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+
+
+def setUpModule():
+    UNHASHED_STATIC.enable()
+
+
+def tearDownModule():
+    UNHASHED_STATIC.disable()
+
+
+TASK_SCAN = re.compile(r'\bSCAN (TABLE )?core_task\b')
+# The only scans of core_task allowed: partial indexes hold just the rows
+# their filter wants. Any other scan, of the table or a full index, fails.
+ACCEPTED_SCANS = {
+    'SCAN core_task USING INDEX task_open_idx',
+    'SCAN core_task USING INDEX task_urgent_idx',
+}
+
+
+class TaskStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.admin = User.objects.create_user('statsadmin', password='x', role=User.ROLE_ADMIN)
+        self.driver = User.objects.create_user('statsdriver', password='x', role=User.ROLE_DRIVER)
+
+    def create_task(self, **fields):
+        fields.setdefault('assigned_to', self.driver)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Task.objects.create(
+                donor_name='Donor', address='Address', phone_numbers='0', location_link='https://maps.example.com/',
+                created_by=self.admin, **fields,
+            )
+
+    def test_counts_match_per_status_counts(self):
+        for status in [Task.STATUS_ASSIGNED, Task.STATUS_IN_PROGRESS, Task.STATUS_COMPLETED, 'CANCELLED']:
+            for urgent in (False, True):
+                self.create_task(status=status, is_urgent=urgent)
+        self.create_task(status=Task.STATUS_ASSIGNED, assigned_to=None, is_broadcast=True)
+
+        tasks = Task.objects.all()
+        expected = {
+            'total': tasks.count(),
+            'pending': tasks.exclude(status=Task.STATUS_COMPLETED).count(),
+            'urgent': tasks.filter(is_urgent=True, status__in=[Task.STATUS_ASSIGNED, Task.STATUS_IN_PROGRESS]).count(),
+            'in_progress': tasks.filter(status=Task.STATUS_IN_PROGRESS).count(),
+            'completed': tasks.filter(status=Task.STATUS_COMPLETED).count(),
+        }
+        self.assertEqual(expected, {'total': 9, 'pending': 7, 'urgent': 2, 'in_progress': 2, 'completed': 2})
+        with self.assertNumQueries(1):
+            self.assertEqual(compute_task_stats(tasks), expected)
+        self.assertEqual(get_global_stats(), expected)
+        self.assertEqual(get_driver_stats(self.driver), expected)
+
+    def test_cached_stats_follow_every_change(self):
+        other = User.objects.create_user('statsother', password='x', role=User.ROLE_DRIVER)
+        task = self.create_task()
+        self.assertEqual(get_driver_stats(self.driver)['total'], 1)
+        with self.assertNumQueries(0):
+            get_driver_stats(self.driver)
+
+        broadcast = self.create_task(assigned_to=None, is_broadcast=True)
+        self.assertEqual(get_global_stats()['total'], 2)
+        self.assertEqual(get_driver_stats(other)['pending'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.status = Task.STATUS_COMPLETED
+            task.save()
+        self.assertEqual(get_driver_stats(self.driver)['completed'], 1)
+        self.assertEqual(get_global_stats()['completed'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(broadcast.claim(other))
+        self.assertEqual(get_driver_stats(self.driver)['total'], 1)
+        self.assertEqual(get_driver_stats(other)['in_progress'], 1)
+        self.assertEqual(get_global_stats()['in_progress'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+        self.assertEqual(get_driver_stats(self.driver)['total'], 0)
+        self.assertEqual(get_global_stats()['total'], 1)
+
+    def test_stats_expire_when_the_change_commits(self):
+        task = self.create_task()
+        get_driver_stats(self.driver)
+        with self.captureOnCommitCallbacks() as callbacks:
+            task.status = Task.STATUS_COMPLETED
+            task.save()
+            with self.assertNumQueries(0):
+                self.assertEqual(get_driver_stats(self.driver)['completed'], 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_driver_stats(self.driver)['completed'], 1)
+
+
+class TaskQueryPlanTests(TestCase):
+    """Hot Task querysets must stay index-driven on a realistically sized table."""
+
+    TASK_COUNT = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('planadmin', password='x', role=User.ROLE_ADMIN)
+        drivers = [
+            User.objects.create_user(f'plandriver{n}', password='x', role=User.ROLE_DRIVER)
+            for n in range(7)
+        ]
+        cls.driver = drivers[0]
+        statuses = [Task.STATUS_COMPLETED] * 6 + [Task.STATUS_ASSIGNED] * 2 + [Task.STATUS_IN_PROGRESS, 'CANCELLED']
+        Task.objects.bulk_create(
+            (
+                Task(
+                    donor_name=f'Donor {n}',
+                    address='Address',
+                    phone_numbers='0000000000',
+                    location_link='https://maps.example.com/',
+                    status=statuses[n % len(statuses)],
+                    is_urgent=n % 17 == 0,
+                    is_broadcast=n % 23 == 0,
+                    assigned_to=None if n % 23 == 0 else drivers[n % len(drivers)],
+                    created_by=cls.admin,
+                )
+                for n in range(cls.TASK_COUNT)
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            # Spread creation dates over a year so date ranges are selective.
+            cursor.execute(
+                "UPDATE core_task SET created_at = datetime('2025-01-01', '+' || (id % 365) || ' days')"
+            )
+            cursor.execute('ANALYZE')
+
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertNoFullScan(self, queryset):
+        plan = self.plan(queryset)
+        scans = [step for step in plan if TASK_SCAN.search(step) and step not in ACCEPTED_SCANS]
+        self.assertFalse(scans, f'Full scan in plan: {plan}')
+
+    def view_queryset(self, view_class, user, **params):
+        view = view_class()
+        view.setup(RequestFactory().get('/', params))
+        view.request.user = user
+        return view.get_queryset()
+
+    def test_task_list(self):
+        cases = [
+            {'status': Task.STATUS_ASSIGNED},
+            {'status': Task.STATUS_COMPLETED},
+            {'filter': 'pending'},
+            {'filter': 'urgent'},
+            {'filter': 'completed'},
+            {'start_date': '2025-03-01', 'end_date': '2025-03-31'},
+            {'status': Task.STATUS_COMPLETED, 'start_date': '2025-03-01'},
+        ]
+        for params in cases:
+            with self.subTest(**params):
+                self.assertNoFullScan(self.view_queryset(views.TaskListView, self.admin, **params))
+
+    def test_task_history(self):
+        for params in [{}, {'start_date': '2025-06-01', 'end_date': '2025-06-30'}]:
+            with self.subTest(**params):
+                self.assertNoFullScan(self.view_queryset(views.TaskHistoryView, self.admin, **params))
+
+    def test_export(self):
+        for params in [{'status': Task.STATUS_COMPLETED}, {'start_date': '2025-12-01', 'end_date': '2025-12-31'}]:
+            with self.subTest(**params):
+                self.assertNoFullScan(self.view_queryset(views.ExportTasksView, self.admin, **params))
+
+    def test_pdf_report(self):
+        cases = [
+            {'status': Task.STATUS_IN_PROGRESS},
+            {'filter': 'pending'},
+            {'filter': 'urgent'},
+            {'start_date': '2025-02-01', 'end_date': '2025-02-28'},
+        ]
+        for params in cases:
+            with self.subTest(**params):
+                self.assertNoFullScan(self.view_queryset(views.TaskPDFView, self.admin, **params))
+
+    def test_driver_dashboard(self):
+        self.assertNoFullScan(self.view_queryset(views.DriverDashboardView, self.driver))
+
+
+class DateRangeFilterTests(TestCase):
+    def test_half_open_bounds(self):
+        date_range = DateRangeFilter('2025-03-01', '2025-03-31')
+        self.assertEqual(date_range.lower.isoformat(), '2025-03-01T00:00:00+00:00')
+        self.assertEqual(date_range.upper.isoformat(), '2025-04-01T00:00:00+00:00')
+
+    def test_bounds_follow_current_timezone(self):
+        with self.settings(TIME_ZONE='Asia/Kolkata'):
+            date_range = DateRangeFilter('2025-03-01', None)
+            self.assertEqual(date_range.lower.isoformat(), '2025-03-01T00:00:00+05:30')
+            self.assertIsNone(date_range.upper)
+
+    def test_invalid_dates_are_ignored(self):
+        date_range = DateRangeFilter('not-a-date', '2025-02-30')
+        self.assertIsNone(date_range.lower)
+        self.assertIsNone(date_range.upper)
+
+    def test_extreme_dates_are_open_bounds(self):
+        date_range = DateRangeFilter('0001-01-01', '9999-12-31')
+        self.assertIsNone(date_range.lower)
+        self.assertIsNone(date_range.upper)
+        self.assertEqual(str(date_range.apply(Task.objects.all()).query), str(Task.objects.all().query))
+        self.client.force_login(User.objects.create_user('maxadmin', password='x', role=User.ROLE_ADMIN))
+        # The open range counts the same rows as no range; keep that total out of other tests.
+        self.addCleanup(cache.clear)
+        for name in ('task_list', 'task_history', 'task_trends'):
+            with self.subTest(view=name):
+                response = self.client.get(reverse(name), {'start_date': '0001-01-01', 'end_date': '9999-12-31'})
+                self.assertEqual(response.status_code, 200)
+
+    def test_trends_window_stops_at_the_first_date(self):
+        self.client.force_login(User.objects.create_user('minadmin', password='x', role=User.ROLE_ADMIN))
+        for end_date in ('0001-01-01', '0001-01-20'):
+            with self.subTest(end_date=end_date):
+                response = self.client.get(reverse('task_trends'), {'end_date': end_date})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['start_date'], date.min)
+
+    def test_end_date_includes_whole_day(self):
+        admin = User.objects.create_user('rangeadmin', password='x', role=User.ROLE_ADMIN)
+        task = Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0', location_link='https://maps.example.com/',
+            created_by=admin,
+        )
+        Task.objects.filter(pk=task.pk).update(created_at='2025-03-31T23:59:59Z')
+        queryset = DateRangeFilter('2025-03-31', '2025-03-31').apply(Task.objects.all())
+        self.assertEqual(list(queryset), [task])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('pageadmin', password='x', role=User.ROLE_ADMIN)
+        cls.tasks = Task.objects.bulk_create(
+            Task(
+                donor_name=f'Donor {n}', address='Address', phone_numbers='0',
+                location_link='https://maps.example.com/', status=Task.STATUS_COMPLETED, created_by=cls.admin,
+            )
+            for n in range(25)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def ids(self, response):
+        return [task.id for task in response.context['tasks']]
+
+    def test_walk_forward_and_back(self):
+        all_ids = sorted(Task.objects.values_list('id', flat=True))
+        first = self.client.get('/tasks/history/')
+        self.assertEqual(self.ids(first), all_ids[:10])
+        self.assertFalse(first.context['page_obj'].has_previous())
+        self.assertEqual(first.context['page_obj'].approximate_total, 25)
+
+        second = self.client.get(f"/tasks/history/?{first.context['page_obj'].next_querystring}")
+        self.assertEqual(self.ids(second), all_ids[10:20])
+        third = self.client.get(f"/tasks/history/?{second.context['page_obj'].next_querystring}")
+        self.assertEqual(self.ids(third), all_ids[20:])
+        self.assertFalse(third.context['page_obj'].has_next())
+
+        back = self.client.get(f"/tasks/history/?{third.context['page_obj'].previous_querystring}")
+        self.assertEqual(self.ids(back), all_ids[10:20])
+
+    def test_cursor_keeps_filters_and_ignores_garbage(self):
+        response = self.client.get('/tasks/?status=COMPLETED&cursor=%%%')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('status=COMPLETED', response.context['page_obj'].next_querystring)
+
+    def test_out_of_range_cursor_is_ignored(self):
+        for value in (2 ** 63, 10 ** 30, 0, -5):
+            with self.subTest(value=value):
+                response = self.client.get('/tasks/history/', {'cursor': encode_cursor(NEXT, value)})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.ids(response), sorted(Task.objects.values_list('id', flat=True))[:10])
+
+
+class ExportTasksTests(TestCase):
+    def test_streams_rows_with_items(self):
+        admin = User.objects.create_user('exportadmin', password='x', role=User.ROLE_ADMIN)
+        task = Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0',
+            location_link='https://maps.example.com/', created_by=admin,
+        )
+        task.items.create(category='Chair', quantity=2)
+        self.client.force_login(admin)
+
+        response = self.client.get('/tasks/export/')
+        self.assertTrue(response.streaming)
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], 'ID,Donor,Address,Status,Driver,Items Collected,Created At')
+        self.assertIn('2 Chair', rows[1])
+        self.assertEqual(len(rows), 2)
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('reportadmin', password='x', role=User.ROLE_ADMIN)
+        self.client.force_login(self.admin)
+
+    def test_identical_filters_share_one_active_job(self):
+        first = self.client.get('/tasks/pdf/', {'status': 'COMPLETED', 'start_date': '2025-01-01'})
+        second = self.client.get('/tasks/pdf/', {'start_date': '2025-01-01', 'status': 'COMPLETED', 'page': '3'})
+        self.assertEqual(first.url, second.url)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_worker_renders_claimed_job(self):
+        Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0',
+            location_link='https://maps.example.com/', created_by=self.admin,
+        )
+        job = request_report(normalise_params({}), user=self.admin)
+        file_field = ReportJob._meta.get_field('file')
+        with tempfile.TemporaryDirectory() as reports_root, \
+                mock.patch.object(file_field, 'storage', FileSystemStorage(location=reports_root)):
+            self.assertEqual(claim_next_job(), job.pk)
+            self.assertIsNone(claim_next_job())
+            self.assertEqual(run_report_job(job.pk), ReportJob.STATUS_DONE)
+
+            status = self.client.get(f'/reports/{job.pk}/status/').json()
+            self.assertEqual(status['progress'], 100)
+            download = self.client.get(status['download_url'])
+            self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+            # Unchanged data: the stored PDF is served without queueing a job.
+            cached = self.client.get('/tasks/pdf/')
+            self.assertEqual(cached['Content-Type'], 'application/pdf')
+            self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_render_merges_chunks(self):
+        for n in range(5):
+            Task.objects.create(
+                donor_name=f'Donor {n}', address='Address', phone_numbers='0',
+                location_link='https://maps.example.com/', created_by=self.admin,
+            )
+        output = io.BytesIO()
+        progress = []
+        with mock.patch('core.reports.REPORT_CHUNK_SIZE', 2):
+            render_report({}, output, progress=progress.append)
+        output.seek(0)
+        pages = PdfReader(output).pages
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(progress, [33, 66, 99])
+        # Numbered across the merged parts, not per part.
+        self.assertEqual([page.extract_text().count('of 3') for page in pages], [1, 1, 1])
+        self.assertIn('Page 3 of 3', pages[2].extract_text())
+
+    def test_fingerprint_changes_with_data(self):
+        before = report_fingerprint({})
+        task = Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0',
+            location_link='https://maps.example.com/', created_by=self.admin,
+        )
+        after_create = report_fingerprint({})
+        self.assertNotEqual(before, after_create)
+        task.delete()
+        self.assertEqual(report_fingerprint({}), before)
+
+    def test_fingerprint_changes_when_a_driver_is_deleted(self):
+        driver = User.objects.create_user('reportdriver', password='x', role=User.ROLE_DRIVER)
+        Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0',
+            location_link='https://maps.example.com/', created_by=self.admin, assigned_to=driver,
+        )
+        before = report_fingerprint({})
+        driver.delete()
+        self.assertNotEqual(report_fingerprint({}), before)
+
+    def test_prune_report_cache(self):
+        with tempfile.TemporaryDirectory() as reports_root:
+            storage = FileSystemStorage(location=reports_root)
+            for name in ('cache/aa/old.pdf', 'cache/bb/used.pdf', 'cache/cc/new.pdf'):
+                storage.save(name, io.BytesIO(b'%PDF'))
+            long_ago = (timezone.now() - timedelta(days=30)).timestamp()
+            for name in ('cache/aa/old.pdf', 'cache/bb/used.pdf'):
+                os.utime(storage.path(name), (long_ago, long_ago))
+            ReportJob.objects.create(params={}, params_hash='a', status=ReportJob.STATUS_DONE,
+                                     file='cache/bb/used.pdf', finished_at=timezone.now())
+            expired = ReportJob.objects.create(params={}, params_hash='b', status=ReportJob.STATUS_DONE,
+                                               file='cache/aa/old.pdf', finished_at=timezone.now() - timedelta(days=30))
+
+            with mock.patch.object(ReportJob._meta.get_field('file'), 'storage', storage):
+                self.assertEqual(prune_report_cache(), 1)
+            self.assertFalse(storage.exists('cache/aa/old.pdf'))
+            self.assertTrue(storage.exists('cache/bb/used.pdf'))
+            self.assertTrue(storage.exists('cache/cc/new.pdf'))
+            self.assertFalse(ReportJob.objects.filter(pk=expired.pk).exists())
+
+
+class ReportingRoutingTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('routingadmin', password='x', role=User.ROLE_ADMIN)
+        self.task = Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0',
+            location_link='https://maps.example.com/', created_by=self.admin,
+        )
+        self.client.force_login(self.admin)
+
+    def test_router(self):
+        router = ReportingRouter()
+        with mock.patch.dict(connections.settings, {REPORTING_DB: {}}):
+            self.assertIsNone(router.db_for_read(Task))
+            with reporting_reads():
+                self.assertEqual(router.db_for_read(Task), REPORTING_DB)
+                self.assertEqual(router.db_for_read(Item), REPORTING_DB)
+                # Job bookkeeping must be current.
+                self.assertIsNone(router.db_for_read(ReportJob))
+                self.assertEqual(router.db_for_write(Task), 'default')
+            self.assertFalse(router.allow_migrate(REPORTING_DB, 'core'))
+        with reporting_reads():
+            # Not configured: everything stays on default.
+            self.assertIsNone(router.db_for_read(Task))
+
+    def test_reporting_views_read_from_reporting(self):
+        for url in ('/tasks/history/', '/tasks/export/', '/tasks/pdf/'):
+            with self.subTest(url=url), mock.patch('core.views.reporting_reads') as reads:
+                self.client.get(url)
+                reads.assert_called_once_with()
+
+    def test_reads_stay_on_default_after_a_write(self):
+        with mock.patch('core.middleware.reporting_configured', return_value=True):
+            self.client.post(reverse('task_cancel', args=[self.task.pk]))
+        with mock.patch('core.views.reporting_reads') as reads:
+            self.client.get('/tasks/history/')
+            self.client.get('/tasks/pdf/')
+        reads.assert_not_called()
+        # The PDF worker must not fall back to the snapshot either.
+        self.assertTrue(ReportJob.objects.get().params[PRIMARY_PARAM])
+
+
+class DailyTaskStatsTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('rollupadmin', password='x', role=User.ROLE_ADMIN)
+        self.driver = User.objects.create_user('rollupdriver', password='x', role=User.ROLE_DRIVER)
+
+    def create_task(self, **fields):
+        return Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0', location_link='https://maps.example.com/',
+            created_by=self.admin, assigned_to=self.driver, category='BOOKS', **fields,
+        )
+
+    def complete(self, task, minutes):
+        started = LocationLog.objects.create(task=task, latitude=1, longitude=1, event=LocationLog.EVENT_START)
+        finished = LocationLog.objects.create(task=task, latitude=1, longitude=1, event=LocationLog.EVENT_COMPLETE)
+        LocationLog.objects.filter(pk=finished.pk).update(timestamp=started.timestamp + timedelta(minutes=minutes))
+        Item.objects.create(task=task, category='Books', quantity=4)
+        task.status = Task.STATUS_COMPLETED
+        task.save()
+
+    def rows(self):
+        return sorted(DailyTaskStats.objects.values_list(
+            'day', 'status', 'category', 'driver', 'tasks', 'urgent', 'items', 'timed_tasks', 'duration_seconds',
+        ))
+
+    def test_maintained_on_commit_and_matches_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_task(is_urgent=True)
+            self.create_task()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.complete(first, minutes=30)
+
+        today = timezone.localdate()
+        self.assertEqual(self.rows(), [
+            (today, Task.STATUS_ASSIGNED, 'BOOKS', self.driver.pk, 1, 0, 0, 0, 0.0),
+            (today, Task.STATUS_COMPLETED, 'BOOKS', self.driver.pk, 1, 1, 4, 1, 1800.0),
+        ])
+        incremental = self.rows()
+        rebuild_daily_stats()
+        self.assertEqual(self.rows(), incremental)
+        self.assertEqual(get_global_stats(), {'total': 2, 'pending': 1, 'urgent': 0, 'in_progress': 0, 'completed': 1})
+
+    def test_rebuild_reads_inside_its_transaction(self):
+        self.create_task()
+        with CaptureQueriesContext(connection) as queries:
+            rebuild_daily_stats(timezone.localdate(), timezone.localdate())
+        sql = [query['sql'] for query in queries]
+        begin = next(n for n, statement in enumerate(sql) if statement.startswith('SAVEPOINT'))
+        read = next(n for n, statement in enumerate(sql) if 'FROM "core_task"' in statement)
+        self.assertLess(begin, read)
+
+    def test_rebuild_command_limits_the_range(self):
+        task = self.create_task()
+        yesterday = timezone.localdate() - timedelta(days=1)
+        Task.objects.filter(pk=task.pk).update(created_at=task.created_at - timedelta(days=1))
+        DailyTaskStats.objects.create(day=timezone.localdate(), status='ASSIGNED', category='OTHER', tasks=9)
+
+        day = yesterday.isoformat()
+        call_command('rebuild_task_stats', '--start', day, '--end', day, stdout=io.StringIO())
+        self.assertEqual(
+            sorted(DailyTaskStats.objects.values_list('day', 'tasks')), [(yesterday, 1), (timezone.localdate(), 9)],
+        )
+
+    def test_trends_chart_reads_the_rollup(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.complete(self.create_task(), minutes=12)
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('task_trends'), {'driver': self.driver.pk})
+        self.assertFalse([query for query in queries if 'core_task' in query['sql']])
+        chart = response.context['chart']
+        self.assertEqual(len(chart['labels']), 30)
+        self.assertEqual(chart['items'][-1], 4)
+        self.assertEqual(chart['mean_minutes'][-1], 12.0)
+        self.assertContains(response, 'vendor/chartjs/chart.umd.min.js')
+
+
+class TaskImportTests(TestCase):
+    HEADER = 'donor_name,address,phone_numbers,location_link,category,qty,is_urgent,driver\n'
+
+    def setUp(self):
+        self.admin = User.objects.create_user('importadmin', password='x', role=User.ROLE_ADMIN)
+        self.driver = User.objects.create_user('importdriver', password='x', role=User.ROLE_DRIVER)
+        self.client.force_login(self.admin)
+
+    def row(self, n, **fields):
+        values = {
+            'donor_name': f'Donor {n}', 'address': f'{n} High Street', 'phone_numbers': '0123',
+            'location_link': 'https://maps.example.com/', 'category': 'books', 'qty': '2', 'is_urgent': 'no',
+            'driver': '', **fields,
+        }
+        return ','.join(values.values()) + '\n'
+
+    def upload(self, rows, **data):
+        upload = SimpleUploadedFile('pickups.csv', (self.HEADER + ''.join(rows)).encode())
+        return self.client.post(reverse('task_import'), {'file': upload, **data})
+
+    def test_creates_tasks_with_one_driver_lookup(self):
+        rows = [self.row(n, driver='ImportDriver' if n % 2 else '', is_urgent='yes' if n == 0 else '') for n in range(30)]
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+                response = self.upload(rows)
+        self.assertEqual(response.context['result'].created, 30)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "core_task"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len([query for query in queries if 'FROM "core_user"' in query['sql']]), 2)
+        publish.assert_called_once_with({
+            'event': TASKS_IMPORTED, 'data': {'count': 30, 'is_broadcast': True, 'driver_ids': [self.driver.pk]},
+        })
+
+        self.assertEqual(Task.objects.filter(assigned_to=self.driver, is_broadcast=False).count(), 15)
+        self.assertEqual(Task.objects.filter(assigned_to=None, is_broadcast=True).count(), 15)
+        first = Task.objects.get(donor_name='Donor 0')
+        self.assertEqual((first.category, first.qty, first.is_urgent, first.created_by), ('BOOKS', 2, True, self.admin))
+        self.assertEqual(DailyTaskStats.objects.filter(day=timezone.localdate()).aggregate(Sum('tasks'))['tasks__sum'], 30)
+
+    def test_inserts_in_batches(self):
+        rows = enumerate([{'donor_name': f'Donor {n}', 'address': 'Street', 'phone_numbers': '0',
+                           'location_link': 'https://maps.example.com/'} for n in range(20)], start=2)
+        with CaptureQueriesContext(connection) as queries:
+            result = import_tasks(rows, created_by=self.admin, batch_size=8)
+        self.assertEqual(result.created, 20)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT INTO "core_task"')]), 3)
+
+        # A bad row after several batches' worth of valid ones is found before any write starts.
+        rows = [(2, {'donor_name': 'Late', 'address': 'Street', 'phone_numbers': '0', 'location_link': 'https://maps.example.com/'})] * 10
+        with CaptureQueriesContext(connection) as queries:
+            result = import_tasks(rows + [(12, {'donor_name': 'Bad'})], created_by=self.admin, batch_size=4)
+        self.assertEqual((result.valid, result.created, len(result.errors)), (10, 0, 1))
+        self.assertFalse(Task.objects.filter(donor_name='Late').exists())
+        self.assertEqual([query['sql'] for query in queries if 'core_user' not in query['sql']], [])
+
+    def test_invalid_rows_are_reported_and_nothing_is_created(self):
+        rows = [self.row(0), self.row(1, driver='nobody'), self.row(2, location_link='not a link', qty='-1')]
+        response = self.upload(rows)
+        self.assertFalse(Task.objects.exists())
+        result = response.context['result']
+        self.assertEqual((result.rows, result.valid, result.created), (3, 1, 0))
+        self.assertEqual([line for line, _ in result.errors], [3, 4])
+        self.assertEqual(set(result.errors[1][1]), {'location_link', 'qty'})
+        self.assertContains(response, 'No driver with username &quot;nobody&quot;.')
+
+    def test_drivers_differing_only_in_case(self):
+        sam = User.objects.create_user('Sam', password='x', role=User.ROLE_DRIVER)
+        other_sam = User.objects.create_user('sam', password='x', role=User.ROLE_DRIVER)
+        rows = enumerate([
+            {'donor_name': f'Donor {n}', 'address': 'Street', 'phone_numbers': '0',
+             'location_link': 'https://maps.example.com/', 'driver': driver}
+            for n, driver in enumerate(['Sam', 'sam', 'SAM', 'IMPORTDRIVER'])
+        ], start=2)
+        result = import_tasks(rows, created_by=self.admin, partial=True)
+        self.assertEqual(result.created, 3)
+        self.assertEqual(
+            dict(Task.objects.values_list('donor_name', 'assigned_to')),
+            {'Donor 0': sam.pk, 'Donor 1': other_sam.pk, 'Donor 3': self.driver.pk},
+        )
+        self.assertEqual(result.errors, [(4, {'driver': [{
+            'message': 'Several drivers match "SAM" (Sam, sam); use the exact username.', 'code': '',
+        }]})])
+
+    def test_partial_import_skips_invalid_rows(self):
+        response = self.upload([self.row(0), self.row(1, category='sofas'), self.row(2)], partial='on')
+        self.assertEqual(sorted(Task.objects.values_list('donor_name', flat=True)), ['Donor 0', 'Donor 2'])
+        self.assertEqual(response.context['result'].errors[0][0], 3)
+
+    def test_dry_run_and_unreadable_files(self):
+        self.upload([self.row(0)], dry_run='on')
+        self.assertFalse(Task.objects.exists())
+
+        response = self.client.post(reverse('task_import'), {'file': SimpleUploadedFile('pickups.txt', b'x')})
+        self.assertFormError(response.context['form'], 'file', 'Upload a .csv or .xlsx file.')
+        response = self.client.post(reverse('task_import'), {
+            'file': SimpleUploadedFile('pickups.csv', b'donor_name,address\nDonor,Street\n'),
+        })
+        self.assertFormError(response.context['form'], 'file', 'Missing column(s): phone_numbers, location_link')
+
+    def test_xlsx(self):
+        try:
+            import openpyxl
+        except ImportError:
+            self.skipTest('openpyxl is not installed')
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['Donor Name', 'Address', 'Phone Numbers', 'Location Link', 'Qty', 'Driver'])
+        workbook.active.append(['Donor', 'Street', '0123', 'https://maps.example.com/', 3, 'importdriver'])
+        content = io.BytesIO()
+        workbook.save(content)
+        self.client.post(reverse('task_import'), {'file': SimpleUploadedFile('pickups.xlsx', content.getvalue())})
+        task = Task.objects.get()
+        self.assertEqual((task.qty, task.assigned_to, task.category), (3, self.driver, 'OTHER'))
+
+    def test_command(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'pickups.csv')
+        errors = os.path.join(directory.name, 'errors.csv')
+        Path(path).write_text(self.HEADER + self.row(0) + self.row(1, is_urgent='maybe'))
+
+        with self.assertRaisesMessage(CommandError, 'nothing imported because 1 row(s) have errors'):
+            call_command('import_tasks', path, '--user', 'importadmin', '--errors', errors, stderr=io.StringIO())
+        self.assertEqual(Path(errors).read_text().splitlines(), [
+            'line,column,error', '3,is_urgent,"Use yes or no, not ""maybe""."',
+        ])
+
+        stdout = io.StringIO()
+        call_command('import_tasks', path, '--user', 'importadmin', '--partial', stdout=stdout, stderr=io.StringIO())
+        self.assertIn('2 row(s) read, 1 valid, 1 task(s) created', stdout.getvalue())
+        with self.assertRaisesMessage(CommandError, 'is not an admin'):
+            call_command('import_tasks', path, '--user', 'importdriver')
+
+
+class PhotoTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        override = self.settings(MEDIA_ROOT=self.media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        admin = User.objects.create_user('photoadmin', password='x', role=User.ROLE_ADMIN)
+        self.task = Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0',
+            location_link='https://maps.example.com/', created_by=admin,
+        )
+
+    def upload(self, size, orientation=None):
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        Image.new('RGB', size, 'red').save(buffer, format='JPEG', exif=exif)
+        return SimpleUploadedFile('camera.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def process(self, photo):
+        self.assertEqual(claim_next_photo(), photo.pk)
+        self.assertEqual(process_photo(photo.pk), TaskPhoto.PROCESSING_DONE)
+        return TaskPhoto.objects.get(pk=photo.pk)
+
+
+class TaskPhotoProcessingTests(PhotoTestCase):
+    def test_saving_leaves_original_for_worker(self):
+        photo = TaskPhoto.objects.create(task=self.task, image=self.upload((4000, 3000)))
+        self.assertEqual(photo.processing_status, TaskPhoto.PROCESSING_PENDING)
+        self.assertTrue(photo.image.name.endswith('.jpg'))
+        self.assertFalse(photo.thumbnail)
+
+    def test_downscales_and_generates_renditions(self):
+        photo = TaskPhoto.objects.create(task=self.task, image=self.upload((4000, 3000)))
+        original = photo.image.path
+        photo = self.process(photo)
+        self.assertEqual(photo.processing_status, TaskPhoto.PROCESSING_DONE)
+        self.assertTrue(os.path.exists(original))
+        self.assertEqual(prune_orphaned_blobs(photo.image.storage, grace_seconds=0)[0], 1)
+        self.assertFalse(os.path.exists(original))
+        self.assertTrue(photo.image.name.endswith('.webp'))
+        self.assertEqual((photo.width, photo.height), (1600, 1200))
+        with Image.open(photo.thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.size, (320, 240))
+        self.assertIn(f'{photo.preview.url} 640w', photo.srcset)
+        self.assertTrue(photo.srcset.endswith(f'{photo.image.url} 1600w'))
+
+    def test_applies_exif_orientation(self):
+        # Orientation 6 means the camera was rotated 90 degrees.
+        photo = self.process(TaskPhoto.objects.create(task=self.task, image=self.upload((800, 600), orientation=6)))
+        self.assertEqual((photo.width, photo.height), (600, 800))
+
+
+class ContentAddressedPhotoTests(PhotoTestCase):
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.media_root.name)
+            for directory, _, files in os.walk(self.media_root.name)
+            for name in files
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        upload = self.upload((400, 300))
+        first = TaskPhoto.objects.create(task=self.task, image=upload)
+        upload.seek(0)
+        second = TaskPhoto.objects.create(task=self.task, image=SimpleUploadedFile('copy.jpg', upload.read()))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.content_hash, content_hash(first.image.name))
+        self.assertEqual(len(first.content_hash), 64)
+        self.assertEqual(self.stored_files(), [first.image.name])
+
+    def test_replaced_blobs_are_pruned_after_a_grace_period(self):
+        upload = self.upload((400, 300))
+        first = TaskPhoto.objects.create(task=self.task, image=upload)
+        original = first.image.path
+        first = self.process(first)
+        storage = first.image.storage
+
+        # Long unreferenced, then reused by an identical upload whose row is not committed yet.
+        long_ago = time.time() - 2 * PRUNE_GRACE_SECONDS
+        os.utime(original, (long_ago, long_ago))
+        upload.seek(0)
+        self.assertEqual(storage.path(storage.save('task_photos/copy.jpg', upload)), original)
+        self.assertEqual(prune_orphaned_blobs(storage), (0, 0))
+        self.assertTrue(os.path.exists(original))
+
+        os.utime(original, (long_ago, long_ago))
+        self.assertEqual(prune_orphaned_blobs(storage)[0], 1)
+        self.assertFalse(os.path.exists(original))
+        self.assertTrue(os.path.exists(first.image.path))
+
+    def test_dedupe_command_collapses_legacy_copies(self):
+        data = self.upload((400, 300)).read()
+        names = ['task_photos/2025/12/13/scan.jpg', 'task_photos/2025/12/29/scan_5sDujUX.jpg']
+        for name in names:
+            os.makedirs(os.path.join(self.media_root.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(self.media_root.name, name), 'wb') as legacy:
+                legacy.write(data)
+        TaskPhoto.objects.bulk_create(
+            TaskPhoto(task=self.task, image=name, width=400, height=300) for name in names
+        )
+
+        out = io.StringIO()
+        call_command('dedupe_photos', stdout=out)
+        self.assertIn('Moved 1 file(s) into blob storage, collapsed 1 duplicate(s)', out.getvalue())
+        blobs = {photo.image.name for photo in TaskPhoto.objects.all()}
+        self.assertEqual(len(blobs), 1)
+        self.assertEqual(self.stored_files(), sorted(blobs))
+        self.assertEqual(
+            set(TaskPhoto.objects.values_list('content_hash', flat=True)), {hashlib.sha256(data).hexdigest()},
+        )
+
+
+class MediaFileTests(PhotoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.photo = TaskPhoto.objects.create(task=self.task, image=self.upload((400, 300)))
+        self.client.force_login(User.objects.get(username='photoadmin'))
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(self.photo.image.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_blobs_are_cached_for_good(self):
+        response = self.client.get(self.photo.image.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        with open(self.photo.image.path, 'rb') as stored:
+            self.assertEqual(b''.join(response.streaming_content), stored.read())
+
+    def test_other_files_are_revalidated(self):
+        os.makedirs(os.path.join(self.media_root.name, 'notes'))
+        with open(os.path.join(self.media_root.name, 'notes', 'readme.txt'), 'w') as note:
+            note.write('hello')
+        response = self.client.get('/media/notes/readme.txt')
+        self.assertIn('no-cache', response['Cache-Control'])
+        response = self.client.get('/media/notes/readme.txt', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_stays_inside_media_root(self):
+        self.assertEqual(self.client.get('/media/../config/settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/task_photos/missing.jpg').status_code, 404)
+
+    def test_web_server_sends_the_file(self):
+        with self.settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect'):
+            response = self.client.get(self.photo.image.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.photo.image.name)
+        self.assertEqual(response.content, b'')
+
+
+class BackupCommandTests(unittest.TestCase):
+    """backup_db against a file-backed SQLite database, as in production."""
+
+    ALIAS = 'backup_source'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        connections.settings[self.ALIAS] = {
+            **copy.deepcopy(connections.settings['default']),
+            'NAME': str(self.root / 'source.sqlite3'),
+        }
+        self.addCleanup(self.drop_alias)
+        with connections[self.ALIAS].schema_editor() as editor:
+            editor.create_model(User)
+        User.objects.using(self.ALIAS).create(username='backedup')
+
+        override = override_settings(BACKUP_ROOT=self.root / 'backups', MEDIA_ROOT=self.root / 'media')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def drop_alias(self):
+        connections[self.ALIAS].close()
+        del connections[self.ALIAS]
+        del connections.settings[self.ALIAS]
+
+    def backup(self, *args):
+        call_command('backup_db', '--verify', '--database', self.ALIAS, *args, stdout=io.StringIO())
+
+    def add_photo(self, name, data):
+        path = self.root / 'media' / 'task_photos' / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    def test_snapshot_is_a_readable_database(self):
+        self.backup()
+        [snapshot] = (self.root / 'backups' / 'db').iterdir()
+        restored = self.root / 'restored.sqlite3'
+        restored.write_bytes(gzip.decompress(snapshot.read_bytes()))
+        with sqlite3.connect(restored) as db:
+            self.assertEqual(db.execute('SELECT username FROM core_user').fetchall(), [('backedup',)])
+
+    def test_media_is_archived_incrementally(self):
+        self.add_photo('2025/01/01/first.jpg', b'first')
+        self.backup('--media')
+        self.add_photo('2025/01/02/second.jpg', b'second')
+        self.backup('--media')
+        self.backup('--media')
+
+        archived = []
+        for archive in sorted((self.root / 'backups' / 'media').glob('media_*.tar.gz')):
+            with tarfile.open(archive) as tar:
+                archived.append(tar.getnames())
+        self.assertEqual(archived, [['task_photos/2025/01/01/first.jpg'], ['task_photos/2025/01/02/second.jpg']])
+
+    def test_old_snapshots_are_pruned(self):
+        for _ in range(3):
+            self.backup('--keep', '2')
+        self.assertEqual(len(list((self.root / 'backups' / 'db').iterdir())), 2)
+
+
+    def test_archives_are_kept_while_a_retained_snapshot_needs_them(self):
+        media = self.root / 'backups' / 'media'
+        self.add_photo('first.jpg', b'first')
+        self.backup('--media', '--keep', '2')
+        [first_archive] = media.glob('media_*.tar.gz')
+        self.backup('--media', '--keep', '2')
+        (self.root / 'media' / 'task_photos' / 'first.jpg').unlink()
+
+        # The second snapshot still has the photo, and only this archive holds it.
+        self.backup('--media', '--keep', '2')
+        self.assertTrue(first_archive.exists())
+        self.backup('--media', '--keep', '2')
+        self.assertFalse(first_archive.exists())
+        self.assertEqual(len(list(media.glob('manifest_*.json'))), 2)
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        override = self.settings(STATIC_ROOT=static_root.name, STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage'},
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.root = Path(static_root.name)
+
+    def test_collectstatic_hashes_and_compresses(self):
+        name = staticfiles_storage.stored_name('vendor/bootstrap/bootstrap.min.css')
+        self.assertRegex(name, r'^vendor/bootstrap/bootstrap\.min\.[0-9a-f]{12}\.css$')
+        self.assertTrue((self.root / f'{name}.gz').exists())
+        # Fonts are compressed already.
+        font = staticfiles_storage.stored_name('vendor/inter/Inter-Regular.woff2')
+        self.assertFalse((self.root / f'{font}.gz').exists())
+
+    def test_serves_hashed_names_compressed_and_immutable(self):
+        url = staticfiles_storage.url('vendor/bootstrap/bootstrap.min.css')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        css = gzip.decompress(b''.join(response.streaming_content))
+        self.assertTrue(css.startswith(b'@charset "UTF-8";/*!\n * Bootstrap'))
+
+        response = self.client.get('/static/vendor/bootstrap/bootstrap.min.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_templates_link_local_assets(self):
+        admin = User.objects.create_user('staticadmin', password='x', role=User.ROLE_ADMIN)
+        self.client.force_login(admin)
+        html = self.client.get(reverse('driver_create')).content.decode()
+        self.assertNotIn('https://', re.sub(r'<a [^>]*>', '', html))
+        self.assertNotIn('chart', html.lower())
+
+
+class PageStylesTests(TestCase):
+    def test_pages_use_the_shared_stylesheet(self):
+        admin = User.objects.create_user('styleadmin', password='x', role=User.ROLE_ADMIN)
+        driver = User.objects.create_user('styledriver', password='x', role=User.ROLE_DRIVER)
+        stylesheet = Path(finders.find('css/app.css')).read_text()
+        pages = [
+            (None, reverse('login'), 'with-navbar page-login'),
+            (admin, reverse('admin_dashboard'), 'page-admin-dashboard'),
+            (admin, reverse('task_list'), 'with-navbar page-task-list'),
+            (admin, reverse('task_trends'), 'with-navbar page-task-trends'),
+            (admin, reverse('task_import'), 'with-navbar page-task-import'),
+            (admin, reverse('driver_create'), 'page-driver-form'),
+            (driver, reverse('driver_dashboard'), 'page-driver-dashboard'),
+        ]
+        for user, url, body_class in pages:
+            with self.subTest(url=url):
+                self.client.logout()
+                if user:
+                    self.client.force_login(user)
+                html = self.client.get(url).content.decode()
+                self.assertIn(f'<body class="{body_class}">', html)
+                self.assertIn('/static/css/app.css', html)
+                self.assertNotIn('<style', html)
+                for name in body_class.split():
+                    self.assertIn(f'.{name}', stylesheet)
+
+
+    def test_templates_only_use_icons_in_the_subset(self):
+        subset = set(re.findall(r'\.(bi-[a-z0-9-]+)::before', Path(finders.find('vendor/bootstrap-icons/bootstrap-icons.css')).read_text()))
+        used = set()
+        for template in (Path(settings.BASE_DIR) / 'templates').rglob('*.html'):
+            used.update(re.findall(r'\bbi-[a-z0-9-]+', template.read_text()))
+        self.assertEqual(used - subset, set())
+
+class CompleteTaskTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        override = self.settings(MEDIA_ROOT=self.media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        admin = User.objects.create_user('completeadmin', password='x', role=User.ROLE_ADMIN)
+        self.driver = User.objects.create_user('completedriver', password='x', role=User.ROLE_DRIVER)
+        self.task = Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0', location_link='https://maps.example.com/',
+            created_by=admin, assigned_to=self.driver, status=Task.STATUS_IN_PROGRESS,
+        )
+        self.client.force_login(self.driver)
+
+    def form_data(self, **extra):
+        data = {
+            'form-TOTAL_FORMS': '2', 'form-INITIAL_FORMS': '0',
+            'form-0-category': 'Chair', 'form-0-quantity': '2', 'form-0-condition': 'GOOD',
+            'form-1-category': 'Table', 'form-1-quantity': '1', 'form-1-condition': 'POOR',
+            'latitude': '11.000000', 'longitude': '77.000000',
+        }
+        for i in range(1, 6):
+            buffer = io.BytesIO()
+            Image.new('RGB', (10, 10)).save(buffer, format='PNG')
+            data[f'image{i}'] = SimpleUploadedFile(f'photo{i}.png', buffer.getvalue(), content_type='image/png')
+        data.update(extra)
+        return data
+
+    def test_completion_is_written_in_one_transaction(self):
+        # Task update, one INSERT per table for items/photos, location log.
+        with self.assertNumQueries(8):
+            response = self.client.post(f'/task/{self.task.pk}/complete/', self.form_data())
+        self.assertRedirects(response, f'/receipt/{self.task.pk}/', fetch_redirect_response=False)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, Task.STATUS_COMPLETED)
+        self.assertEqual(self.task.items.count(), 2)
+        self.assertEqual(self.task.photos.count(), 5)
+        self.assertEqual(self.task.location_logs.get().event, 'COMPLETE')
+
+    def test_missing_visitor_form_photo_stores_nothing(self):
+        response = self.client.post(f'/task/{self.task.pk}/complete/', self.form_data(visitor_form_filled='on'))
+        self.assertEqual(response.status_code, 200)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, Task.STATUS_IN_PROGRESS)
+        self.assertFalse(self.task.items.exists())
+        self.assertFalse(self.task.photos.exists())
+
+
+class ViewQueryBudgetTests(TestCase):
+    """Every view in core/urls.py must render within a fixed number of queries.
+
+    Pages are rendered against enough related rows that an N+1 pattern would
+    blow the budget. A new URL without a budget fails ``test_every_view_has_a_budget``.
+    """
+
+    # url name -> (user, method, maximum queries)
+    BUDGETS = {
+        'dashboard': ('admin', 'get', 1),
+        'admin_dashboard': ('admin', 'get', 3),
+        'task_create': ('admin', 'get', 2),
+        'task_list': ('admin', 'get', 3),
+        'task_history': ('admin', 'get', 3),
+        'admin_task_detail': ('admin', 'get', 5),
+        'task_cancel': ('admin', 'post', 3),
+        'task_reset': ('admin', 'post', 3),
+        'task_import': ('admin', 'get', 2),
+        'task_export': ('admin', 'get', 3),
+        'task_trends': ('admin', 'get', 4),
+        'task_pdf_report': ('admin', 'get', 6),
+        'report_job_detail': ('admin', 'get', 2),
+        'report_job_status': ('admin', 'get', 2),
+        'report_job_download': ('admin', 'get', 2),
+        'driver_list': ('admin', 'get', 2),
+        'driver_create': ('admin', 'get', 1),
+        'driver_delete': ('admin', 'post', 12),
+        'driver_dashboard': ('driver', 'get', 3),
+        'driver_task_detail': ('driver', 'get', 2),
+        'task_complete': ('driver', 'get', 2),
+        'receipt_view': ('driver', 'get', 5),
+        'driver_task_feed': ('driver', 'get', 3),
+        'driver_task_events': ('driver', 'get', 1),
+        'task_photo_uploads': ('driver', 'get', 3),
+        'task_sync_complete': ('driver', 'post', 2),
+        'service_worker': ('driver', 'get', 1),
+        'web_manifest': ('driver', 'get', 1),
+        'photo_upload_chunk': ('driver', 'get', 2),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('budgetadmin', password='x', role=User.ROLE_ADMIN)
+        cls.driver = User.objects.create_user('budgetdriver', password='x', role=User.ROLE_DRIVER)
+        cls.other_driver = User.objects.create_user('budgetother', password='x', role=User.ROLE_DRIVER)
+        tasks = Task.objects.bulk_create(
+            Task(
+                donor_name=f'Donor {n}', address='Address', phone_numbers='0',
+                location_link='https://maps.example.com/', created_by=cls.admin,
+                assigned_to=cls.driver, status=Task.STATUS_COMPLETED,
+            )
+            for n in range(12)
+        )
+        cls.task = tasks[0]
+        cls.task.completion_key = uuid.uuid4()
+        cls.task.save(update_fields=['completion_key'])
+        Item.objects.bulk_create(Item(task=cls.task, category=f'Item {n}') for n in range(3))
+        TaskPhoto.objects.bulk_create(
+            TaskPhoto(
+                task=cls.task, image=f'task_photos/photo{n}.jpg', width=1600, height=1200,
+                processing_status=TaskPhoto.PROCESSING_DONE,
+            )
+            for n in range(3)
+        )
+        LocationLog.objects.bulk_create(
+            LocationLog(task=cls.task, latitude=11, longitude=77, event=event)
+            for event in (LocationLog.EVENT_START, LocationLog.EVENT_COMPLETE)
+        )
+        cls.upload = PhotoUpload.objects.create(
+            key=uuid.uuid4(), task=tasks[1], uploaded_by=cls.driver, slot=1, size=10, sha256='0' * 64,
+        )
+        cls.job = ReportJob.objects.create(
+            params={}, params_hash='0' * 64, status=ReportJob.STATUS_DONE, file='budget.pdf',
+        )
+
+    def setUp(self):
+        self.reports_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.reports_root.cleanup)
+        storage = FileSystemStorage(location=self.reports_root.name)
+        storage.save('budget.pdf', io.BytesIO(b'%PDF-1.4'))
+        patcher = mock.patch.object(ReportJob._meta.get_field('file'), 'storage', storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def url_kwargs(self, name):
+        pk = {
+            'report_job_detail': self.job.pk,
+            'report_job_status': self.job.pk,
+            'report_job_download': self.job.pk,
+            'driver_delete': self.other_driver.pk,
+        }.get(name, self.task.pk)
+        pattern = next(p for p in core_urls.urlpatterns if p.name == name)
+        if 'key' in pattern.pattern.converters:
+            return {'key': self.upload.key}
+        return {'pk': pk} if 'pk' in pattern.pattern.converters else {}
+
+    def request_kwargs(self, name):
+        if name == 'task_sync_complete':
+            # A replay of the submission that completed the task.
+            return {'data': {'key': str(self.task.completion_key)}, 'content_type': 'application/json'}
+        return {}
+
+    def test_every_view_has_a_budget(self):
+        self.assertEqual({p.name for p in core_urls.urlpatterns}, set(self.BUDGETS))
+
+    def test_views_stay_within_budget(self):
+        for name, (user, method, budget) in self.BUDGETS.items():
+            with self.subTest(view=name):
+                self.client.force_login(getattr(self, user))
+                url = reverse(name, kwargs=self.url_kwargs(name))
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(self.client, method)(url, **self.request_kwargs(name))
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertLess(response.status_code, 400)
+                self.assertLessEqual(
+                    len(queries), budget,
+                    f'{name} ran {len(queries)} queries (budget {budget}):\n'
+                    + '\n'.join(q['sql'] for q in queries.captured_queries),
+                )
+
+
+class OfflineSyncTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        override = self.settings(MEDIA_ROOT=self.media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        patcher = mock.patch.object(uploads, 'PHOTO_UPLOAD_TEMP_DIR', Path(self.temp_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        admin = User.objects.create_user('syncadmin', password='x', role=User.ROLE_ADMIN)
+        self.driver = User.objects.create_user('syncdriver', password='x', role=User.ROLE_DRIVER)
+        self.task = Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0', location_link='https://maps.example.com/',
+            created_by=admin, assigned_to=self.driver, status=Task.STATUS_IN_PROGRESS,
+        )
+        self.client.force_login(self.driver)
+        self.uploads_url = reverse('task_photo_uploads', kwargs={'pk': self.task.pk})
+        self.complete_url = reverse('task_sync_complete', kwargs={'pk': self.task.pk})
+
+    def jpeg(self, color='red'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), color).save(buffer, format='JPEG')
+        return buffer.getvalue()
+
+    def start(self, slot, data, key=None, sha256=None):
+        return self.client.post(self.uploads_url, {
+            'key': str(key or uuid.uuid4()), 'slot': slot, 'filename': f'photo{slot}.jpg',
+            'size': len(data), 'sha256': sha256 or hashlib.sha256(data).hexdigest(),
+        }, content_type='application/json')
+
+    def send_chunk(self, session, data, offset):
+        return self.client.patch(
+            session['url'], data, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self, slot, key=None):
+        data = self.jpeg()
+        session = self.start(slot, data, key).json()
+        return self.send_chunk(session, data, 0)
+
+    def completion(self, photos, **extra):
+        body = {
+            'key': str(uuid.uuid4()), 'visitor_form_filled': False, 'trust_notice_given': True,
+            'items': [{'category': 'Chair', 'quantity': 2, 'condition': 'GOOD'}],
+            'photos': photos, 'latitude': '11.0', 'longitude': '77.0', **extra,
+        }
+        return body, self.client.post(self.complete_url, body, content_type='application/json')
+
+    def test_repeated_upload_is_stored_once(self):
+        key = uuid.uuid4()
+        data = self.jpeg()
+        self.assertEqual(self.start(1, data, key).status_code, 201)
+        self.assertEqual(self.start(1, data, key).status_code, 200)
+        self.assertEqual(self.upload(1, key).json()['complete'], True)
+        uploads = self.client.get(self.uploads_url).json()['uploads']
+        self.assertEqual([(upload['key'], upload['complete']) for upload in uploads], [(str(key), True)])
+
+    def test_upload_resumes_from_server_offset(self):
+        data = self.jpeg('blue')
+        session = self.start(1, data).json()
+        half = len(data) // 2
+        self.assertEqual(self.send_chunk(session, data[:half], 0).json()['offset'], half)
+
+        # A client that lost the answer re-sends the first chunk and is told where to resume.
+        retry = self.send_chunk(session, data[:half], 0)
+        self.assertEqual(retry.status_code, 409)
+        self.assertEqual(retry.json()['offset'], half)
+
+        done = self.send_chunk(session, data[half:], half).json()
+        self.assertTrue(done['complete'])
+        upload = PhotoUpload.objects.get(key=session['key'])
+        with upload.file.open('rb') as stored:
+            self.assertEqual(stored.read(), data)
+        self.assertFalse(os.listdir(self.temp_dir.name))
+
+    def test_checksum_mismatch_restarts_upload(self):
+        data = self.jpeg()
+        session = self.start(1, data, sha256='0' * 64).json()
+        response = self.send_chunk(session, data, 0)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 0)
+        self.assertFalse(PhotoUpload.objects.get(key=session['key']).file)
+
+    def test_oversized_chunk_is_refused(self):
+        data = self.jpeg()
+        session = self.start(1, data).json()
+        with mock.patch.object(views, 'PHOTO_UPLOAD_MAX_CHUNK', 10):
+            self.assertEqual(self.send_chunk(session, data, 0).status_code, 413)
+
+    def test_completion_is_applied_once(self):
+        photos = {slot: self.upload(slot).json()['key'] for slot in range(1, 6)}
+        retake = self.upload(1).json()['key']
+        unfinished = self.start(6, self.jpeg()).json()['key']
+        body, response = self.completion(photos)
+        self.assertEqual(response.status_code, 201)
+
+        replay = self.client.post(self.complete_url, body, content_type='application/json')
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()['receipt_url'], reverse('receipt_view', kwargs={'pk': self.task.pk}))
+        _, other = self.completion(photos)
+        self.assertEqual(other.status_code, 409)
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, Task.STATUS_COMPLETED)
+        self.assertTrue(self.task.trust_notice_given)
+        self.assertEqual(self.task.items.get().quantity, 2)
+        self.assertEqual(self.task.photos.count(), 5)
+        self.assertEqual(self.task.location_logs.get().event, LocationLog.EVENT_COMPLETE)
+        self.assertFalse(PhotoUpload.objects.exists())
+        stored = [name for _, _, files in os.walk(self.media_root.name) for name in files]
+        self.assertFalse([name for name in stored if retake in name or unfinished in name])
+
+    def test_missing_photos_are_rejected(self):
+        photos = {slot: self.upload(slot).json()['key'] for slot in range(1, 6)}
+        _, response = self.completion(photos, visitor_form_filled=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors']['photos'], ['Photo 6 has not been uploaded.'])
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, Task.STATUS_IN_PROGRESS)
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('debugadmin', password='x', role=User.ROLE_ADMIN)
+        self.client.force_login(self.admin)
+
+    def test_warns_with_view_name_when_over_budget(self):
+        with self.settings(DEBUG=True, QUERY_BUDGET=1), self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get('/tasks/')
+        self.assertIn('core.views.TaskListView ran', logs.output[0])
+
+    def test_silent_within_budget(self):
+        with self.settings(DEBUG=True, QUERY_BUDGET=10), self.assertNoLogs('core.middleware', 'WARNING'):
+            self.client.get('/tasks/')
+
+
+class BroadcastClaimTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_user('claimadmin', password='x', role=User.ROLE_ADMIN)
+        self.winner = User.objects.create_user('claimwinner', password='x', role=User.ROLE_DRIVER)
+        self.loser = User.objects.create_user('claimloser', password='x', role=User.ROLE_DRIVER)
+        self.task = Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0', location_link='https://maps.example.com/',
+            created_by=admin, is_broadcast=True,
+        )
+
+    def test_second_driver_is_turned_away(self):
+        claim = Task.claim
+
+        def claimed_first(task, driver):
+            # The winner's claim lands after the loser's request loaded the task.
+            claim(Task.objects.get(pk=task.pk), self.winner)
+            return claim(task, driver)
+
+        self.client.force_login(self.loser)
+        with mock.patch.object(Task, 'claim', claimed_first):
+            response = self.client.post(f'/task/{self.task.pk}/', {'action': 'start_task'})
+        self.assertRedirects(response, '/my-tasks/', fetch_redirect_response=False)
+        notices = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn('Sorry, another driver has already claimed this task.', notices)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.assigned_to, self.winner)
+        self.assertEqual(self.task.status, Task.STATUS_IN_PROGRESS)
+
+    def test_other_drivers_tasks_are_not_found(self):
+        Task.objects.filter(pk=self.task.pk).update(is_broadcast=False, assigned_to=self.winner)
+        self.client.force_login(self.loser)
+        for action in ('other', 'start_task'):
+            with self.subTest(action=action):
+                self.assertEqual(self.client.post(f'/task/{self.task.pk}/', {'action': action}).status_code, 404)
+
+
+class BroadcastClaimConcurrencyTests(unittest.TestCase):
+    """Concurrent claims against a file-backed SQLite database produce one winner."""
+
+    ALIAS = 'claim_stress'
+    DRIVERS = 12
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.settings[self.ALIAS] = {
+            **copy.deepcopy(connections.settings['default']),
+            'NAME': os.path.join(directory.name, 'claims.sqlite3'),
+        }
+        self.addCleanup(self.drop_alias)
+        with connections[self.ALIAS].schema_editor() as editor:
+            # A claim refreshes the task's rollup, which reads items and logs.
+            for model in (User, Task, Item, LocationLog, DailyTaskStats):
+                editor.create_model(model)
+
+        users = User.objects.using(self.ALIAS)
+        admin = users.create(username='admin', role=User.ROLE_ADMIN)
+        self.drivers = [users.create(username=f'driver{n}', role=User.ROLE_DRIVER) for n in range(self.DRIVERS)]
+        self.task = Task.objects.using(self.ALIAS).create(
+            donor_name='Donor', address='Address', phone_numbers='0', location_link='https://maps.example.com/',
+            created_by=admin, is_broadcast=True,
+        )
+
+    def drop_alias(self):
+        connections[self.ALIAS].close()
+        del connections[self.ALIAS]
+        del connections.settings[self.ALIAS]
+
+    def test_exactly_one_winner(self):
+        barrier = threading.Barrier(self.DRIVERS)
+        results = {}
+
+        def claim(driver):
+            try:
+                task = Task.objects.using(self.ALIAS).get(pk=self.task.pk)
+                barrier.wait()
+                results[driver.pk] = task.claim(driver)
+            finally:
+                connections[self.ALIAS].close()
+
+        threads = [threading.Thread(target=claim, args=(driver,)) for driver in self.drivers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.DRIVERS)
+        winners = [pk for pk, won in results.items() if won]
+        self.assertEqual(len(winners), 1)
+        task = Task.objects.using(self.ALIAS).get(pk=self.task.pk)
+        self.assertEqual(task.assigned_to_id, winners[0])
+        self.assertFalse(task.is_broadcast)
+
+
+class SQLiteBackendTests(unittest.TestCase):
+    """The core SQLite backend tunes every connection to a database file."""
+
+    ALIAS = 'pragmas'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.settings[self.ALIAS] = {
+            **copy.deepcopy(connections.settings['default']),
+            'NAME': os.path.join(directory.name, 'pragmas.sqlite3'),
+        }
+        self.addCleanup(self.drop_alias)
+
+    def drop_alias(self):
+        connections[self.ALIAS].close()
+        del connections[self.ALIAS]
+        del connections.settings[self.ALIAS]
+
+    def pragma(self, name):
+        with connections[self.ALIAS].cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), 10000)
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+        self.assertEqual(self.pragma('foreign_keys'), 1)
+
+    def test_health_check_detects_closed_connection(self):
+        connection = connections[self.ALIAS]
+        connection.ensure_connection()
+        self.assertTrue(connection.is_usable())
+        connection.connection.close()
+        self.assertFalse(connection.is_usable())
+
+
+class DriverTaskFeedTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('feedadmin', password='x', role=User.ROLE_ADMIN)
+        self.driver = User.objects.create_user('feeddriver', password='x', role=User.ROLE_DRIVER)
+        self.task = Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0', location_link='https://maps.example.com/',
+            created_by=self.admin, assigned_to=self.driver,
+        )
+        self.client.force_login(self.driver)
+        self.url = reverse('driver_task_feed')
+
+    def test_unchanged_list_is_revalidated_cheaply(self):
+        response = self.client.get(self.url)
+        self.assertEqual([task['id'] for task in response.json()['tasks']], [self.task.pk])
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        etag = response['ETag']
+
+        # Session lookups come from the cache; the user row and the version aggregate remain.
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('no-store', response.get('Cache-Control', ''))
+
+    def test_version_changes_when_list_changes(self):
+        etag = self.client.get(self.url)['ETag']
+        self.task.status = Task.STATUS_COMPLETED
+        self.task.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['tasks'], [])
+
+    def test_html_pages_are_still_never_cached(self):
+        response = self.client.get(reverse('driver_dashboard'))
+        self.assertIn('no-store', response['Cache-Control'])
+
+
+class DriverTaskEventsTests(TestCase):
+    def setUp(self):
+        self.driver = User.objects.create_user('eventdriver', password='x', role=User.ROLE_DRIVER)
+        self.other = User.objects.create_user('eventother', password='x', role=User.ROLE_DRIVER)
+        self.async_client.force_login(self.driver)
+
+    def message(self, **task):
+        return {'event': TASK_CREATED, 'data': {'id': 1, 'is_broadcast': False, 'assigned_to_id': None, **task}}
+
+    def test_wsgi_request_gets_no_stream(self):
+        self.client.force_login(self.driver)
+        self.assertEqual(self.client.get(reverse('driver_task_events')).status_code, 204)
+
+    def test_cancel_is_published_once_without_donor_details(self):
+        admin = User.objects.create_user('eventadmin', password='x', role=User.ROLE_ADMIN)
+        task = Task.objects.create(
+            donor_name='Donor', address='Address', phone_numbers='0', location_link='https://maps.example.com/',
+            created_by=admin, assigned_to=self.other,
+        )
+        task = Task.objects.get(pk=task.pk)
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                task.status = 'CANCELLED'
+                task.save()
+                task.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                Task.objects.get(pk=task.pk).save()
+        publish.assert_called_once_with({
+            'event': TASK_CANCELLED, 'data': {'id': task.pk, 'is_broadcast': False, 'assigned_to_id': self.other.pk},
+        })
+        message = publish.call_args.args[0]
+        self.assertFalse(visible_to_driver(message, self.driver.pk))
+        self.assertTrue(visible_to_driver(message, self.other.pk))
+
+    async def test_streams_only_tasks_visible_to_driver(self):
+        response = await self.async_client.get(reverse('driver_task_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        get_broker().publish(self.message(id=1, assigned_to_id=self.other.pk))
+        get_broker().publish(self.message(id=2, assigned_to_id=self.driver.pk))
+        chunk = await asyncio.wait_for(anext(stream), timeout=5)
+        self.assertTrue(chunk.startswith(b'event: task.created\ndata: {"id": 2,'))
+        await stream.aclose()
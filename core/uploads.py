@@ -0,0 +1,99 @@
+import hashlib
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from PIL import Image
+
+from .models import PhotoUpload
+
+PHOTO_UPLOAD_TEMP_DIR = Path(getattr(settings, 'PHOTO_UPLOAD_TEMP_DIR', settings.BASE_DIR / 'upload_tmp'))
+# Largest photo accepted, and largest single chunk; a chunk is streamed to
+# disk, never held in memory whole.
+PHOTO_UPLOAD_MAX_SIZE = getattr(settings, 'PHOTO_UPLOAD_MAX_SIZE', 25 * 1024 * 1024)
+PHOTO_UPLOAD_MAX_CHUNK = getattr(settings, 'PHOTO_UPLOAD_MAX_CHUNK', 4 * 1024 * 1024)
+
+COPY_BUFFER = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the upload currently ends."""
+
+    def __init__(self, offset):
+        super().__init__(f'Upload is at offset {offset}')
+        self.offset = offset
+
+
+def temp_path(upload):
+    return PHOTO_UPLOAD_TEMP_DIR / f'{upload.key}.part'
+
+
+def append_chunk(upload, offset, stream, length):
+    """Write ``length`` bytes from ``stream`` at ``offset`` of ``upload``.
+
+    Bytes that did arrive before a dropped connection are kept, so the client
+    resumes from the new offset. The last chunk triggers :func:`finish_upload`.
+    """
+    if upload.completed_at or offset != upload.offset:
+        raise OffsetMismatch(upload.offset)
+    if offset + length > upload.size:
+        raise UploadError('Chunk runs past the declared size of the photo.')
+
+    path = temp_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with open(path, 'r+b' if path.exists() else 'wb') as part:
+        part.seek(offset)
+        part.truncate()
+        while written < length:
+            data = stream.read(min(COPY_BUFFER, length - written))
+            if not data:
+                break
+            part.write(data)
+            written += len(data)
+
+    # Conditional UPDATE: of two racing copies of a chunk only one advances the offset.
+    moved = PhotoUpload.objects.filter(pk=upload.pk, offset=offset).update(offset=offset + written)
+    if not moved:
+        upload.refresh_from_db(fields=['offset'])
+        raise OffsetMismatch(upload.offset)
+    upload.offset = offset + written
+    if upload.offset == upload.size:
+        finish_upload(upload)
+    return upload
+
+
+def _reset(upload, message):
+    temp_path(upload).unlink(missing_ok=True)
+    PhotoUpload.objects.filter(pk=upload.pk).update(offset=0)
+    upload.offset = 0
+    raise UploadError(message)
+
+
+def finish_upload(upload):
+    """Verify a fully received upload and move it into media storage."""
+    path = temp_path(upload)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(COPY_BUFFER), b''):
+            digest.update(block)
+    if digest.hexdigest() != upload.sha256:
+        _reset(upload, 'Checksum mismatch; the photo has to be uploaded again.')
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        _reset(upload, 'The uploaded file is not a valid image.')
+
+    extension = os.path.splitext(upload.filename)[1].lower() or '.jpg'
+    with open(path, 'rb') as part:
+        upload.file.save(f'{upload.key}{extension}', File(part), save=False)
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['file', 'completed_at'])
+    path.unlink()
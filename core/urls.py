@@ -13,8 +13,13 @@ urlpatterns = [
     path('tasks/<int:pk>/admin/', views.AdminTaskDetailView.as_view(), name='admin_task_detail'),
     path('tasks/<int:pk>/cancel/', views.TaskCancelView.as_view(), name='task_cancel'),
     path('tasks/<int:pk>/reset/', views.TaskResetView.as_view(), name='task_reset'),
+    path('tasks/import/', views.TaskImportView.as_view(), name='task_import'),
     path('tasks/export/', views.ExportTasksView.as_view(), name='task_export'),
+    path('tasks/trends/', views.TaskTrendsView.as_view(), name='task_trends'),
     path('tasks/pdf/', views.TaskPDFView.as_view(), name='task_pdf_report'),
+    path('reports/<int:pk>/', views.ReportJobDetailView.as_view(), name='report_job_detail'),
+    path('reports/<int:pk>/status/', views.ReportJobStatusView.as_view(), name='report_job_status'),
+    path('reports/<int:pk>/download/', views.ReportJobDownloadView.as_view(), name='report_job_download'),
     
     # Driver Management (Admin)
     path('drivers/', views.DriverListView.as_view(), name='driver_list'),
@@ -23,8 +28,17 @@ urlpatterns = [
     
     # Driver Interface
     path('my-tasks/', views.DriverDashboardView.as_view(), name='driver_dashboard'),
+    path('my-tasks/feed/', views.DriverTaskListJSONView.as_view(), name='driver_task_feed'),
+    path('my-tasks/events/', views.driver_task_events, name='driver_task_events'),
     path('task/<int:pk>/', views.DriverTaskDetailView.as_view(), name='driver_task_detail'),
     path('task/<int:pk>/complete/', views.complete_task_view, name='task_complete'),
+
+    # Offline sync (driver PWA)
+    path('api/tasks/<int:pk>/uploads/', views.TaskPhotoUploadView.as_view(), name='task_photo_uploads'),
+    path('api/uploads/<uuid:key>/', views.PhotoUploadChunkView.as_view(), name='photo_upload_chunk'),
+    path('api/tasks/<int:pk>/complete/', views.TaskSyncCompleteView.as_view(), name='task_sync_complete'),
+    path('sw.js', views.service_worker, name='service_worker'),
+    path('manifest.webmanifest', views.web_manifest, name='web_manifest'),
     
     # Receipt
     path('receipt/<int:pk>/', views.receipt_view, name='receipt_view'),
@@ -1,20 +1,54 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, Max, Q, Sum
 from django.utils import timezone
-from .models import Task, Item, TaskPhoto, LocationLog
-from .forms import TaskCreationForm, TaskCompletionForm, ItemForm, TaskPhotoForm, TaskPhotoMultipleForm
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag
+from django.views.static import was_modified_since
+from .models import Task, Item, LocationLog, PhotoUpload, ReportJob, DailyTaskStats, User
+from .forms import (
+    TaskCreationForm, TaskCompletionForm, ItemForm, TaskPhotoForm, TaskPhotoMultipleForm, PhotoUploadForm, TaskImportForm,
+)
+from .stats import get_global_stats, get_driver_stats
+from .filters import DateRangeFilter
+from .completion import (
+    REQUIRED_PHOTO_SLOTS, VISITOR_FORM_SLOT, CompletionConflict, complete_from_uploads, complete_task,
+)
+from .imports import IMPORT_COLUMNS, TaskImportError, import_tasks, read_rows
+from .uploads import PHOTO_UPLOAD_MAX_CHUNK, OffsetMismatch, UploadError, append_chunk
+from .loaders import driver_task_queryset, task_detail_queryset
+from .events import driver_event_stream, task_payload
+from .pagination import KeysetPaginationMixin
+from .storage import content_hash
+from .routers import reads_pinned_to_primary, reporting_reads
+from .reports import PRIMARY_PARAM, cached_report, normalise_params, report_queryset, report_storage, request_report
 from django.forms import modelformset_factory
 
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, JsonResponse,
+    StreamingHttpResponse,
+)
+from asgiref.sync import sync_to_async
 import csv
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-from django.contrib.staticfiles import finders
+from datetime import date, timedelta
+import hashlib
+import json
+import mimetypes
+import os
+import uuid
+from urllib.parse import quote
 
 @login_required
 def dashboard(request):
@@ -32,22 +66,29 @@ class DriverRequiredMixin(UserPassesTestMixin):
     def test_func(self):
         return self.request.user.is_authenticated and self.request.user.role == 'DRIVER'
 
+class ReportingReadsMixin:
+    """Serve the view's task reads from the reporting database (see core.routers)."""
+    def dispatch(self, request, *args, **kwargs):
+        if reads_pinned_to_primary(request):
+            return super().dispatch(request, *args, **kwargs)
+        with reporting_reads():
+            return super().dispatch(request, *args, **kwargs)
+
 # ADMIN VIEWS
 class AdminDashboardView(AdminRequiredMixin, View):
     def get(self, request):
-        total_tasks = Task.objects.count()
-        pending_tasks = Task.objects.exclude(status='COMPLETED').count()
-        urgent_tasks = Task.objects.filter(is_urgent=True, status__in=['ASSIGNED', 'IN_PROGRESS']).count()
-        completed_tasks = Task.objects.filter(status='COMPLETED').count()
+        stats = get_global_stats()
         
         # Recent tasks
-        recent_tasks = Task.objects.order_by('-created_at')[:5]
+        recent_tasks = Task.objects.select_related('assigned_to').only(
+            'donor_name', 'status', 'is_urgent', 'created_at', 'assigned_to__username',
+        ).order_by('-created_at')[:5]
         
         context = {
-            'total_tasks': total_tasks,
-            'pending_tasks': pending_tasks,
-            'urgent_tasks': urgent_tasks,
-            'completed_tasks': completed_tasks,
+            'total_tasks': stats['total'],
+            'pending_tasks': stats['pending'],
+            'urgent_tasks': stats['urgent'],
+            'completed_tasks': stats['completed'],
             'recent_tasks': recent_tasks,
         }
         return render(request, 'core/dashboard_admin.html', context)
@@ -65,26 +106,60 @@ class TaskCreateView(AdminRequiredMixin, CreateView):
         messages.success(self.request, "Task created successfully.")
         return super().form_valid(form)
 
-class TaskListView(AdminRequiredMixin, ListView):
+class TaskImportView(AdminRequiredMixin, View):
+    """Creates tasks in bulk from a CSV or XLSX file of donor pickups.
+
+    The file is validated row by row; the page lists each invalid row by its
+    line number so the spreadsheet can be fixed and uploaded again.
+    """
+    template_name = 'core/task_import.html'
+
+    def get(self, request):
+        return self.render(TaskImportForm())
+
+    def post(self, request):
+        form = TaskImportForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return self.render(form)
+        upload = form.cleaned_data['file']
+        try:
+            result = import_tasks(
+                read_rows(upload), created_by=request.user,
+                dry_run=form.cleaned_data['dry_run'], partial=form.cleaned_data['partial'],
+            )
+        except TaskImportError as exc:
+            form.add_error('file', str(exc))
+            return self.render(form)
+
+        if result.created:
+            messages.success(request, f"Imported {result.created} task(s) from {upload.name}.")
+        elif form.cleaned_data['dry_run'] and not result.errors:
+            messages.success(request, f"All {result.rows} row(s) of {upload.name} are valid.")
+        if result.errors and not result.created:
+            messages.error(request, f"Nothing was imported: {len(result.errors)} row(s) have errors.")
+        return self.render(form, result=result)
+
+    def render(self, form, **context):
+        return render(self.request, self.template_name, {'form': form, 'columns': IMPORT_COLUMNS, **context})
+
+class TaskListView(AdminRequiredMixin, KeysetPaginationMixin, ListView):
     model = Task
     template_name = 'core/task_list.html'
     context_object_name = 'tasks'
     paginate_by = 10
+    approximate_total_timeout = 300
+    # Columns task_list.html renders
+    list_fields = ('donor_name', 'address', 'status', 'is_urgent', 'created_at', 'assigned_to__username')
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('assigned_to').only(*self.list_fields)
         status = self.request.GET.get('status')
         filter_type = self.request.GET.get('filter')
-        start_date = self.request.GET.get('start_date')
-        end_date = self.request.GET.get('end_date')
         
         if status:
             queryset = queryset.filter(status=status)
         
-        if start_date:
-            queryset = queryset.filter(created_at__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(created_at__date__lte=end_date)
+        queryset = DateRangeFilter.from_request(self.request).apply(queryset)
         
         if filter_type == 'pending':
             queryset = queryset.exclude(status='COMPLETED')
@@ -106,21 +181,18 @@ class TaskListView(AdminRequiredMixin, ListView):
         context['is_cancelled'] = (status == 'CANCELLED')
         return context
 
-class TaskHistoryView(AdminRequiredMixin, ListView):
+class TaskHistoryView(AdminRequiredMixin, ReportingReadsMixin, KeysetPaginationMixin, ListView):
     model = Task
     template_name = 'core/task_history.html'
     context_object_name = 'tasks'
     paginate_by = 10
+    approximate_total_timeout = 300
+    # Columns task_history.html renders
+    list_fields = ('donor_name', 'is_urgent', 'created_at', 'assigned_to__username')
 
     def get_queryset(self):
-        queryset = Task.objects.filter(status='COMPLETED')
-        start_date = self.request.GET.get('start_date')
-        end_date = self.request.GET.get('end_date')
-        
-        if start_date:
-            queryset = queryset.filter(created_at__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(created_at__date__lte=end_date)
+        queryset = Task.objects.filter(status='COMPLETED').select_related('assigned_to').only(*self.list_fields)
+        queryset = DateRangeFilter.from_request(self.request).apply(queryset)
             
         return queryset.order_by('id')
 
@@ -132,85 +204,146 @@ class AdminTaskDetailView(AdminRequiredMixin, DetailView):
     template_name = 'core/task_detail_admin.html'
     context_object_name = 'task'
 
-class ExportTasksView(AdminRequiredMixin, View):
-    def get(self, request):
-        status = request.GET.get('status')
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
+    def get_queryset(self):
+        return task_detail_queryset()
+
+class Echo:
+    """Pseudo-buffer for csv.writer: hands each encoded row straight back."""
+    def write(self, value):
+        return value
+
+class ExportTasksView(AdminRequiredMixin, ReportingReadsMixin, View):
+    # Tasks (and their prefetched items) are read this many rows at a time,
+    # so memory stays flat however large the export is.
+    chunk_size = 2000
+
+    def get_queryset(self):
+        status = self.request.GET.get('status')
 
         tasks = Task.objects.all().select_related('assigned_to').prefetch_related('items')
 
         if status:
             tasks = tasks.filter(status=status)
-        if start_date:
-            tasks = tasks.filter(created_at__date__gte=start_date)
-        if end_date:
-            tasks = tasks.filter(created_at__date__lte=end_date)
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="tasks_export.csv"'
+        return DateRangeFilter.from_request(self.request).apply(tasks).order_by('id')
 
-        writer = csv.writer(response)
-        writer.writerow(['ID', 'Donor', 'Address', 'Status', 'Driver', 'Items Collected', 'Created At'])
+    def iter_rows(self, writer, tasks):
+        yield writer.writerow(['ID', 'Donor', 'Address', 'Status', 'Driver', 'Items Collected', 'Created At'])
 
         for task in tasks:
             items_str = ", ".join([f"{i.quantity} {i.category}" for i in task.items.all()])
             driver = task.assigned_to.username if task.assigned_to else 'Unassigned'
-            writer.writerow([task.id, task.donor_name, task.address, task.get_status_display(), driver, items_str, task.created_at])
+            yield writer.writerow([task.id, task.donor_name, task.address, task.get_status_display(), driver, items_str, task.created_at])
 
-        return response
-
-
-class TaskPDFView(AdminRequiredMixin, View):
     def get(self, request):
-        status = request.GET.get('status')
-        filter_type = request.GET.get('filter')
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
+        # iterator() prefetches items once per chunk instead of for the whole export.
+        # Rows are read as the response streams, after dispatch() has returned,
+        # so the database is fixed here.
+        tasks = self.get_queryset().using(router.db_for_read(Task)).iterator(chunk_size=self.chunk_size)
+        writer = csv.writer(Echo())
 
-        tasks = Task.objects.all().select_related('assigned_to')
+        response = StreamingHttpResponse(self.iter_rows(writer, tasks), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="tasks_export.csv"'
+        return response
 
-        if status:
-            tasks = tasks.filter(status=status)
-        
-        if start_date:
-            tasks = tasks.filter(created_at__date__gte=start_date)
-        if end_date:
-            tasks = tasks.filter(created_at__date__lte=end_date)
-        
-        if filter_type == 'pending':
-            tasks = tasks.exclude(status='COMPLETED')
-        elif filter_type == 'urgent':
-            tasks = tasks.filter(is_urgent=True)
-        elif filter_type == 'completed':
-            tasks = tasks.filter(status='COMPLETED')
 
-        tasks = tasks.order_by('id')
+class TaskPDFView(AdminRequiredMixin, ReportingReadsMixin, View):
+    def get_queryset(self):
+        return report_queryset(normalise_params(self.request.GET))
 
-        template_path = 'core/task_list_pdf.html'
-        context = {
-            'tasks': tasks,
-            'start_date': start_date,
-            'end_date': end_date,
-            'status': status,
-            'filter_type': filter_type,
-            'generated_at': timezone.now(),
-        }
-        
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'filename="tasks_report.pdf"'
-        
-        template = get_template(template_path)
-        html = template.render(context)
+    def get(self, request):
+        params = normalise_params(request.GET)
+        if reads_pinned_to_primary(request):
+            # The worker must render this admin's recent changes too.
+            params[PRIMARY_PARAM] = True
+        # Unchanged data since the last render: serve the stored PDF directly.
+        cached = cached_report(params)
+        if cached:
+            return FileResponse(report_storage().open(cached, 'rb'), content_type='application/pdf', filename='tasks_report.pdf')
+
+        # Rendering happens in the report worker; identical filters share one job.
+        job = request_report(params, user=request.user)
+        return redirect('report_job_detail', pk=job.pk)
+
+class TaskTrendsView(AdminRequiredMixin, ReportingReadsMixin, View):
+    """Tasks, items and start-to-complete times per day, from the DailyTaskStats rollup.
+
+    Reads one row per day and group, so a year costs the same whatever the
+    number of tasks.
+    """
+    default_days = 30
+    max_days = 366
+
+    @staticmethod
+    def days_before(end, days):
+        """First day of the ``days``-day window ending at ``end``, stopping at ``date.min``."""
+        return end - min(timedelta(days=days - 1), end - date.min)
 
-        # Create the PDF
-        pisa_status = pisa.CreatePDF(
-           html, dest=response
+    def get(self, request):
+        date_range = DateRangeFilter.from_request(request)
+        end = date_range.end_date or timezone.localdate()
+        start = date_range.start_date or self.days_before(end, self.default_days)
+        start = min(max(start, self.days_before(end, self.max_days)), end)
+
+        rows = DailyTaskStats.objects.filter(day__range=(start, end))
+        driver = request.GET.get('driver', '')
+        if driver.isdigit():
+            rows = rows.filter(driver_id=driver)
+        rows = rows.values('day', 'status').annotate(
+            count=Sum('tasks'), item_total=Sum('items'), timed=Sum('timed_tasks'), duration=Sum('duration_seconds'),
         )
 
-        if pisa_status.err:
-           return HttpResponse('We had some errors <pre>' + html + '</pre>')
-        return response
+        days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+        index = {day: n for n, day in enumerate(days)}
+        statuses = dict(Task.STATUS_CHOICES)
+        tasks = {status: [0] * len(days) for status in statuses}
+        items = [0] * len(days)
+        timed = [0] * len(days)
+        duration = [0.0] * len(days)
+        for row in rows:
+            n = index[row['day']]
+            tasks[row['status']][n] += row['count']
+            items[n] += row['item_total']
+            timed[n] += row['timed']
+            duration[n] += row['duration']
+
+        chart = {
+            'labels': [day.isoformat() for day in days],
+            'tasks': [{'status': status, 'label': label, 'data': tasks[status]} for status, label in statuses.items()],
+            'items': items,
+            'mean_minutes': [round(d / t / 60, 1) if t else None for d, t in zip(duration, timed)],
+        }
+        context = {
+            'start_date': start,
+            'end_date': end,
+            'drivers': User.objects.filter(role=User.ROLE_DRIVER).order_by('username').only('username'),
+            'current_driver': driver,
+            'chart': chart,
+            'total_tasks': sum(sum(counts) for counts in tasks.values()),
+            'completed_tasks': sum(tasks[Task.STATUS_COMPLETED]),
+            'total_items': sum(items),
+            'mean_minutes': round(sum(duration) / sum(timed) / 60) if sum(timed) else None,
+        }
+        return render(request, 'core/task_trends.html', context)
+
+class ReportJobDetailView(AdminRequiredMixin, DetailView):
+    model = ReportJob
+    template_name = 'core/report_job.html'
+    context_object_name = 'job'
+
+class ReportJobStatusView(AdminRequiredMixin, View):
+    def get(self, request, pk):
+        job = get_object_or_404(ReportJob, pk=pk)
+        return JsonResponse({
+            'status': job.status,
+            'progress': job.progress,
+            'error': job.error,
+            'download_url': reverse('report_job_download', args=[job.pk]) if job.status == ReportJob.STATUS_DONE else None,
+        })
+
+class ReportJobDownloadView(AdminRequiredMixin, View):
+    def get(self, request, pk):
+        job = get_object_or_404(ReportJob, pk=pk, status=ReportJob.STATUS_DONE)
+        return FileResponse(job.file.open('rb'), content_type='application/pdf', filename='tasks_report.pdf')
 
 class TaskCancelView(AdminRequiredMixin, View):
     def post(self, request, pk):
@@ -231,7 +364,6 @@ class TaskResetView(AdminRequiredMixin, View):
         return response
 
 from django.contrib.auth.hashers import make_password
-from .models import User
 
 class DriverListView(AdminRequiredMixin, ListView):
     model = User
@@ -272,19 +404,59 @@ class DriverDashboardView(DriverRequiredMixin, ListView):
 
     def get_queryset(self):
         # Sort by Urgent first, then Created At
-        return Task.objects.filter(
-            Q(assigned_to=self.request.user) | Q(is_broadcast=True)
-        ).exclude(status='COMPLETED').order_by('-is_urgent', '-created_at')
+        return driver_task_queryset(self.request.user).order_by('-is_urgent', '-created_at')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Get all tasks for this driver (including completed)
-        all_tasks = Task.objects.filter(Q(assigned_to=self.request.user) | Q(is_broadcast=True))
-        context['total_tasks'] = all_tasks.count()
-        context['in_progress_tasks'] = all_tasks.filter(status='IN_PROGRESS').count()
-        context['completed_tasks'] = all_tasks.filter(status='COMPLETED').count()
+        # Counts over all tasks for this driver (including completed)
+        stats = get_driver_stats(self.request.user)
+        context['total_tasks'] = stats['total']
+        context['in_progress_tasks'] = stats['in_progress']
+        context['completed_tasks'] = stats['completed']
         return context
 
+def driver_task_list_etag(request):
+    """Version of the driver's task list: changes whenever a task enters, leaves or is edited.
+
+    One aggregate over the open-task index, so an unchanged list is confirmed
+    without loading or serialising any rows.
+    """
+    state = driver_task_queryset(request.user).aggregate(last_updated=Max('updated_at'), count=Count('id'))
+    last_updated = state['last_updated'].isoformat() if state['last_updated'] else ''
+    token = f"{request.user.pk}:{state['count']}:{last_updated}"
+    return hashlib.md5(token.encode(), usedforsecurity=False).hexdigest()
+
+# Cacheable by the browser only, and always revalidated (the 304s included).
+@method_decorator([cache_control(private=True, no_cache=True), etag(driver_task_list_etag)], name='get')
+class DriverTaskListJSONView(DriverRequiredMixin, View):
+    """The driver dashboard's task list as JSON, for cheap conditional polling.
+
+    Clients send back the ETag in ``If-None-Match``; while nothing has changed
+    the answer is an empty 304 after a single query.
+    """
+    query_budget = 3
+
+    def get(self, request):
+        tasks = driver_task_queryset(request.user).order_by('-is_urgent', '-created_at')
+        return JsonResponse({'tasks': [task_payload(task) for task in tasks]})
+
+def _request_driver(request):
+    user = request.user
+    return user if user.is_authenticated and user.role == 'DRIVER' else None
+
+async def driver_task_events(request):
+    """Push task created/claimed/cancelled events to a driver's dashboard."""
+    driver = await sync_to_async(_request_driver)(request)
+    if driver is None:
+        return HttpResponseForbidden()
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker cannot hold the stream open; 204 stops EventSource retrying.
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(driver_event_stream(driver.pk), content_type='text/event-stream')
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 class DriverTaskDetailView(DriverRequiredMixin, DetailView):
     model = Task
     template_name = 'core/task_detail_driver.html'
@@ -295,15 +467,16 @@ class DriverTaskDetailView(DriverRequiredMixin, DetailView):
     def post(self, request, *args, **kwargs):
         task = self.get_object()
         action = request.POST.get('action')
-        
-        if action == 'start_task':
-            # Claim the task if it was broadcast
-            if task.is_broadcast:
-                task.is_broadcast = False
-                task.assigned_to = request.user
 
-            task.status = 'IN_PROGRESS'
-            task.save()
+        if action == 'start_task':
+            # Claim the task if it was broadcast; only one driver can win.
+            if task.assigned_to_id != request.user.pk:
+                if not task.claim(request.user):
+                    messages.error(request, "Sorry, another driver has already claimed this task.")
+                    return redirect('driver_dashboard')
+            else:
+                task.status = 'IN_PROGRESS'
+                task.save()
             
             # Save location
             lat = request.POST.get('latitude')
@@ -340,40 +513,18 @@ def complete_task_view(request, pk):
             if visitor_form_filled and not image6:
                 photo_form.add_error(None, "Please upload the Visitor Form photo (Photo 6) since you marked it as filled.")
             else:
-                task_form.save()
-            
-            instances = item_formset.save(commit=False)
-            for instance in instances:
-                instance.task = task
-                instance.save()
-            
-            # Save uploaded images from the 6 separate fields
-            for i in range(1, 7):
-                field_name = f'image{i}'
-                img = photo_form.cleaned_data.get(field_name)
-                if img:
-                    TaskPhoto.objects.create(task=task, image=img, photo_type='ITEM')
-
-            task.status = 'COMPLETED'
-            task.completed_at = timezone.now()
-            task.save()
-            
-            # Save location
-            lat = request.POST.get('latitude')
-            lng = request.POST.get('longitude')
-            if lat and lng:
-                LocationLog.objects.create(
-                    task=task,
-                    latitude=lat,
-                    longitude=lng,
-                    event='COMPLETE'
+                task = task_form.save(commit=False)
+                images = [photo_form.cleaned_data.get(f'image{i}') for i in range(1, 7)]
+                complete_task(
+                    task,
+                    item_formset.save(commit=False),
+                    [image for image in images if image],
+                    request.POST.get('latitude'),
+                    request.POST.get('longitude'),
                 )
-            
-            messages.success(request, "Task completed successfully!")
-            item_formset = ItemFormSet(queryset=Item.objects.none())
-            photo_form = TaskPhotoMultipleForm()
 
-            return redirect('receipt_view', pk=task.pk)
+                messages.success(request, "Task completed successfully!")
+                return redirect('receipt_view', pk=task.pk)
     else:
         task_form = TaskCompletionForm(instance=task)
         item_formset = ItemFormSet(queryset=Item.objects.none())
@@ -388,9 +539,9 @@ def complete_task_view(request, pk):
 
 @login_required
 def receipt_view(request, pk):
-    task = get_object_or_404(Task, pk=pk)
+    task = get_object_or_404(task_detail_queryset(), pk=pk)
     # Check permission (either admin/superuser or the driver who did it)
-    if not (request.user.role == 'ADMIN' or request.user.is_superuser or task.assigned_to == request.user):
+    if not (request.user.role == 'ADMIN' or request.user.is_superuser or task.assigned_to_id == request.user.pk):
          return redirect('login') # Or 403
 
     items = task.items.all()
@@ -408,3 +559,214 @@ def receipt_view(request, pk):
         'photos': task.photos.all(),
     }
     return render(request, 'core/receipt.html', context)
+
+# OFFLINE SYNC
+class DriverTaskAPIMixin(DriverRequiredMixin):
+    """JSON endpoints for a task assigned to the requesting driver."""
+    raise_exception = True
+
+    def get_task(self):
+        return get_object_or_404(Task, pk=self.kwargs['pk'], assigned_to=self.request.user)
+
+def _upload_payload(upload):
+    return {
+        'key': str(upload.key),
+        'slot': upload.slot,
+        'size': upload.size,
+        'offset': upload.offset,
+        'complete': upload.completed_at is not None,
+        'url': reverse('photo_upload_chunk', kwargs={'key': upload.key}),
+    }
+
+class TaskPhotoUploadView(DriverTaskAPIMixin, View):
+    """Open upload sessions for completion photos, keyed by a client-generated UUID.
+
+    POST takes JSON (``key``, ``slot``, ``filename``, ``size``, ``sha256``);
+    the bytes then go to the session URL in chunks. GET lists the sessions
+    with their offsets so a resumed sync only sends what is missing, and
+    POSTing a key that already exists answers with that session.
+    """
+    def get(self, request, pk):
+        uploads = PhotoUpload.objects.filter(task=self.get_task(), uploaded_by=request.user).order_by('id')
+        return JsonResponse({'uploads': [_upload_payload(upload) for upload in uploads]})
+
+    def post(self, request, pk):
+        task = self.get_task()
+        try:
+            data = json.loads(request.body)
+            key = uuid.UUID(str(data.get('key', '')))
+        except (ValueError, AttributeError):
+            return JsonResponse({'errors': {'key': ['Enter a valid UUID.']}}, status=400)
+
+        existing = PhotoUpload.objects.filter(key=key).first()
+        if existing is None:
+            if task.status == Task.STATUS_COMPLETED:
+                return JsonResponse({'errors': {'__all__': ['This task is already completed.']}}, status=409)
+            form = PhotoUploadForm(data)
+            if not form.is_valid():
+                return JsonResponse({'errors': form.errors}, status=400)
+            upload = form.save(commit=False)
+            upload.task = task
+            upload.uploaded_by = request.user
+            try:
+                with transaction.atomic():
+                    upload.save()
+            except IntegrityError:
+                # A retry of the same request got there first.
+                existing = PhotoUpload.objects.get(key=key)
+            else:
+                return JsonResponse(_upload_payload(upload), status=201)
+
+        if existing.task_id != task.pk:
+            return JsonResponse({'errors': {'key': ['This key belongs to another task.']}}, status=409)
+        return JsonResponse(_upload_payload(existing))
+
+class PhotoUploadChunkView(DriverRequiredMixin, View):
+    """Resumable upload of one photo's bytes.
+
+    GET reports how much has arrived. PATCH appends the raw request body at
+    the ``Upload-Offset`` header; a mismatched offset gets 409 with the
+    current one, so the client can resume from there. The body is streamed
+    to a temporary file and never read into memory whole.
+    """
+    raise_exception = True
+
+    def get_upload(self):
+        return get_object_or_404(PhotoUpload, key=self.kwargs['key'], uploaded_by=self.request.user)
+
+    def get(self, request, key):
+        return JsonResponse(_upload_payload(self.get_upload()))
+
+    def patch(self, request, key):
+        upload = self.get_upload()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.META['CONTENT_LENGTH'])
+        except (KeyError, ValueError):
+            return JsonResponse({'errors': {'__all__': ['Upload-Offset and Content-Length are required.']}}, status=400)
+        if length > PHOTO_UPLOAD_MAX_CHUNK:
+            return JsonResponse({'errors': {'__all__': [f'Chunks are limited to {PHOTO_UPLOAD_MAX_CHUNK} bytes.']}}, status=413)
+
+        try:
+            append_chunk(upload, offset, request, length)
+        except OffsetMismatch as exc:
+            return JsonResponse({**_upload_payload(upload), 'offset': exc.offset}, status=409)
+        except UploadError as exc:
+            return JsonResponse({**_upload_payload(upload), 'errors': {'__all__': [str(exc)]}}, status=400)
+        return JsonResponse(_upload_payload(upload))
+
+class TaskSyncCompleteView(DriverTaskAPIMixin, View):
+    """Apply an offline completion whose photos were uploaded beforehand.
+
+    The body is JSON: ``key`` (the submission's UUID), the two completion
+    flags, ``items``, ``photos`` (slot -> upload key) and optional
+    ``latitude``/``longitude``. Replaying a submission that was already
+    applied returns the same answer, so clients can retry blindly.
+    """
+    def post(self, request, pk):
+        task = self.get_task()
+        try:
+            data = json.loads(request.body)
+            key = uuid.UUID(str(data.get('key', '')))
+            photo_keys = {int(slot): uuid.UUID(str(value)) for slot, value in (data.get('photos') or {}).items()}
+        except (ValueError, AttributeError):
+            return JsonResponse({'errors': {'__all__': ['Malformed completion.']}}, status=400)
+        receipt_url = reverse('receipt_view', kwargs={'pk': task.pk})
+
+        if task.completion_key == key:
+            return JsonResponse({'completed': False, 'receipt_url': receipt_url})
+        if task.status == Task.STATUS_COMPLETED:
+            return JsonResponse({'errors': {'__all__': ['This task is already completed.']}}, status=409)
+
+        task_form = TaskCompletionForm({
+            'visitor_form_filled': bool(data.get('visitor_form_filled')),
+            'trust_notice_given': bool(data.get('trust_notice_given')),
+        }, instance=task)
+        item_forms = [ItemForm(item) for item in data.get('items') or []]
+        errors = {}
+        if not task_form.is_valid():
+            errors.update(task_form.errors)
+        item_errors = [form.errors for form in item_forms if not form.is_valid()]
+        if item_errors:
+            errors['items'] = item_errors
+
+        required = set(REQUIRED_PHOTO_SLOTS)
+        if task_form.cleaned_data.get('visitor_form_filled'):
+            required.add(VISITOR_FORM_SLOT)
+        received = set(PhotoUpload.objects.filter(
+            task=task, key__in=photo_keys.values(), completed_at__isnull=False,
+        ).values_list('key', flat=True))
+        missing = sorted(slot for slot in required if photo_keys.get(slot) not in received)
+        unknown = sorted(slot for slot, value in photo_keys.items() if value not in received)
+        if missing or unknown:
+            errors['photos'] = [f"Photo {slot} has not been uploaded." for slot in sorted(set(missing) | set(unknown))]
+        if errors:
+            return JsonResponse({'errors': errors}, status=400)
+
+        try:
+            completed = complete_from_uploads(
+                task_form.save(commit=False),
+                key,
+                [form.save(commit=False) for form in item_forms],
+                photo_keys,
+                data.get('latitude'),
+                data.get('longitude'),
+            )
+        except CompletionConflict:
+            return JsonResponse({'errors': {'__all__': ['This task is already completed.']}}, status=409)
+        return JsonResponse({'completed': completed, 'receipt_url': receipt_url}, status=201 if completed else 200)
+
+def service_worker(request):
+    # Served from the site root so its scope covers every driver page.
+    response = render(request, 'core/sw.js', content_type='application/javascript')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def web_manifest(request):
+    return render(request, 'core/manifest.webmanifest', content_type='application/manifest+json')
+
+# ==========================================
+# MEDIA
+# ==========================================
+
+# Photo blobs are named after their content and never change.
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+@login_required
+def media_file(request, path):
+    """Serve an uploaded file to signed-in users.
+
+    With ``MEDIA_SENDFILE_HEADER`` set the web server sends the bytes itself
+    (``X-Accel-Redirect`` for nginx, ``X-Sendfile`` for Apache/lighttpd);
+    otherwise the file goes out as a FileResponse, which WSGI servers pass
+    to ``sendfile()`` through ``wsgi.file_wrapper``.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    stat = os.stat(full_path)
+    immutable = bool(content_hash(path))
+    if not immutable and not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    header = settings.MEDIA_SENDFILE_HEADER
+    if header == 'X-Accel-Redirect':
+        response = HttpResponse(content_type=content_type)
+        response[header] = settings.MEDIA_SENDFILE_PREFIX + quote(path)
+    elif header == 'X-Sendfile':
+        response = HttpResponse(content_type=content_type)
+        response[header] = full_path
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if immutable:
+        patch_cache_control(response, private=True, max_age=MEDIA_IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,54 @@
+# Entry points for spawned worker processes. This module must stay importable
+# before Django is set up, so everything touching models is imported lazily.
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def run_report_job(job_id):
+    from .reports import run_report_job
+    return run_report_job(job_id)
+
+
+def process_photo(photo_id):
+    from .images import process_photo
+    return process_photo(photo_id)
+
+
+def serve_queue(claim, target, on_result, workers, poll_interval, once=False):
+    """Feed ids from ``claim()`` to ``target`` in a pool of spawned processes.
+
+    ``claim`` runs in this process and returns the next id (already marked as
+    taken) or ``None``. ``on_result(item_id, result, error)`` is called here as
+    each item finishes. With ``once`` the loop exits when the queue is drained.
+    """
+    running = {}
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as pool:
+        while True:
+            while len(running) < workers:
+                item_id = claim()
+                if item_id is None:
+                    break
+                running[pool.submit(target, item_id)] = item_id
+
+            if not running:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                item_id = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    on_result(item_id, None, e)
+                else:
+                    on_result(item_id, result, None)
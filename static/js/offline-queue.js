@@ -0,0 +1,182 @@
+/*
+ * Offline completion queue for the driver app.
+ *
+ * A completion (flags, items, GPS and the photos as Blobs) is stored in
+ * IndexedDB first and then synced through the idempotent API: each photo is
+ * uploaded on its own under a client-generated key, in chunks that resume
+ * from whatever the server already has, and the completion is sent last.
+ * Interrupted syncs simply run again. Loaded by the pages and by the
+ * service worker.
+ */
+(function (scope) {
+    const DB_NAME = 'home2hope';
+    const STORE = 'completions';
+    const API_ROOT = '/api/tasks/';
+    const SYNC_TAG = 'completions';
+    // Bytes per upload request; small enough to get through on a weak signal.
+    const CHUNK_SIZE = 512 * 1024;
+
+    const supported = 'indexedDB' in scope && 'crypto' in scope && 'randomUUID' in scope.crypto;
+
+    function openDb() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(DB_NAME, 1);
+            request.onupgradeneeded = () => request.result.createObjectStore(STORE, { keyPath: 'key' });
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async function withStore(mode, action) {
+        const db = await openDb();
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(STORE, mode);
+            const request = action(tx.objectStore(STORE));
+            tx.oncomplete = () => { db.close(); resolve(request.result); };
+            tx.onerror = tx.onabort = () => { db.close(); reject(tx.error); };
+        });
+    }
+
+    const put = entry => withStore('readwrite', store => store.put(entry));
+    const remove = key => withStore('readwrite', store => store.delete(key));
+    const all = () => withStore('readonly', store => store.getAll());
+
+    // The server rejected the data itself; retrying the same request cannot help.
+    class Rejected extends Error {}
+
+    function describe(errors) {
+        if (!errors) return '';
+        return Object.values(errors).flat().map(error =>
+            typeof error === 'string' ? error : describe(error)
+        ).join(' ');
+    }
+
+    async function check(response) {
+        // 403 (signed out, stale CSRF token) and 5xx are worth retrying later.
+        if ([400, 404, 409, 413].includes(response.status)) {
+            const body = await response.json().catch(() => ({}));
+            throw new Rejected(describe(body.errors) || `Rejected by the server (${response.status})`);
+        }
+        if (!response.ok) throw new Error(`Server answered ${response.status}`);
+        return response.json();
+    }
+
+    async function send(url, options, csrfToken) {
+        const response = await fetch(url, {
+            credentials: 'same-origin',
+            ...options,
+            headers: { 'X-CSRFToken': csrfToken, ...(options.headers || {}) },
+        });
+        return check(response);
+    }
+
+    async function sha256(blob) {
+        const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    // Send one photo in CHUNK_SIZE pieces, resuming ``session`` if the server has part of it.
+    async function uploadPhoto(uploadsUrl, photo, session, csrfToken) {
+        if (!session) {
+            session = await send(uploadsUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    key: photo.key,
+                    slot: photo.slot,
+                    filename: photo.name,
+                    size: photo.blob.size,
+                    sha256: await sha256(photo.blob),
+                }),
+            }, csrfToken);
+        }
+        while (!session.complete) {
+            const response = await fetch(session.url, {
+                method: 'PATCH',
+                credentials: 'same-origin',
+                headers: {
+                    'X-CSRFToken': csrfToken,
+                    'Upload-Offset': String(session.offset),
+                    'Content-Type': 'application/offset+octet-stream',
+                },
+                body: photo.blob.slice(session.offset, session.offset + CHUNK_SIZE),
+            });
+            // 409: the server is elsewhere in the file (e.g. an earlier chunk did
+            // arrive); carry on from its offset.
+            session = response.status === 409 ? await response.json() : await check(response);
+        }
+    }
+
+    async function syncEntry(entry, csrfToken) {
+        const uploadsUrl = `${API_ROOT}${entry.taskId}/uploads/`;
+        const { uploads } = await send(uploadsUrl, { method: 'GET' }, csrfToken);
+        const sessions = new Map(uploads.map(upload => [upload.key, upload]));
+
+        const photos = {};
+        for (const photo of entry.photos) {
+            photos[photo.slot] = photo.key;
+            await uploadPhoto(uploadsUrl, photo, sessions.get(photo.key), csrfToken);
+        }
+
+        return send(`${API_ROOT}${entry.taskId}/complete/`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                key: entry.key,
+                visitor_form_filled: entry.visitorFormFilled,
+                trust_notice_given: entry.trustNoticeGiven,
+                items: entry.items,
+                photos,
+                latitude: entry.latitude,
+                longitude: entry.longitude,
+            }),
+        }, csrfToken);
+    }
+
+    let running = null;
+
+    // Sync every queued completion that has not been rejected. Resolves to
+    // { synced: [{ key, taskId, receiptUrl }], rejected: [entry], pending: n }.
+    function syncAll(csrfToken) {
+        if (running) return running;
+        running = (async () => {
+            const result = { synced: [], rejected: [], pending: 0 };
+            const entries = await all();
+            for (const [index, entry] of entries.entries()) {
+                if (entry.error) {
+                    result.rejected.push(entry);
+                    continue;
+                }
+                try {
+                    const answer = await syncEntry(entry, csrfToken || entry.csrfToken);
+                    await remove(entry.key);
+                    result.synced.push({ key: entry.key, taskId: entry.taskId, receiptUrl: answer.receipt_url });
+                } catch (error) {
+                    if (error instanceof Rejected) {
+                        entry.error = error.message;
+                        await put(entry);
+                        result.rejected.push(entry);
+                    } else {
+                        // Offline or server trouble: leave this and the rest for the next attempt.
+                        result.pending = entries.slice(index).filter(later => !later.error).length;
+                        break;
+                    }
+                }
+            }
+            return result;
+        })().finally(() => { running = null; });
+        return running;
+    }
+
+    // Ask the service worker to sync once connectivity returns, where supported.
+    async function scheduleSync() {
+        if (!('serviceWorker' in navigator)) return;
+        const registration = await navigator.serviceWorker.ready;
+        if ('sync' in registration) await registration.sync.register(SYNC_TAG);
+    }
+
+    scope.OfflineQueue = {
+        supported, SYNC_TAG, put, remove, all, syncAll, scheduleSync,
+        newKey: () => scope.crypto.randomUUID(),
+    };
+})(self);
@@ -0,0 +1,126 @@
+{% load static %}/*
+ * Service worker for the driver app.
+ *
+ * Driver pages are served network-first and kept in a cache, so the tasks
+ * assigned to a driver stay readable without signal; static assets are
+ * served cache-first. Queued completions are synced in the background
+ * (see static/js/offline-queue.js).
+ */
+importScripts("{% static 'js/offline-queue.js' %}");
+
+const VERSION = 'v2';
+const ASSETS = `assets-${VERSION}`;
+const PAGES = `pages-${VERSION}`;
+
+// Static names carry a content hash, so a deploy changes this list (and so
+// this script); assets that are no longer listed are dropped on activation.
+const PRECACHE = [
+    "{% static 'js/offline-queue.js' %}",
+    "{% static 'Img/Ramajeyam_Trust.PNG' %}",
+    "{% static 'css/app.css' %}",
+    "{% static 'vendor/bootstrap/bootstrap.min.css' %}",
+    "{% static 'vendor/bootstrap/bootstrap.bundle.min.js' %}",
+    "{% static 'vendor/bootstrap-icons/bootstrap-icons.css' %}",
+    "{% static 'vendor/bootstrap-icons/bootstrap-icons.woff2' %}",
+    "{% static 'vendor/inter/inter.css' %}",
+    "{% static 'vendor/inter/Inter-Regular.woff2' %}",
+    "{% static 'vendor/inter/Inter-Medium.woff2' %}",
+    "{% static 'vendor/inter/Inter-SemiBold.woff2' %}",
+    "{% static 'vendor/inter/Inter-Bold.woff2' %}",
+];
+const STATIC_PREFIX = "{% get_static_prefix %}";
+
+const DASHBOARD = "{% url 'driver_dashboard' %}";
+const LOGIN = "{% url 'login' %}";
+// Pages a driver needs in the field: the dashboard, task details and the completion form.
+const OFFLINE_PAGES = /^\/(my-tasks\/|task\/\d+\/(complete\/)?)$/;
+
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const cache = await caches.open(ASSETS);
+        await cache.addAll(PRECACHE);
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const keys = await caches.keys();
+        await Promise.all(keys.filter(key => ![ASSETS, PAGES].includes(key)).map(key => caches.delete(key)));
+        const cache = await caches.open(ASSETS);
+        const current = new Set(PRECACHE.map(path => new URL(path, self.location).href));
+        for (const request of await cache.keys()) {
+            if (!current.has(request.url)) await cache.delete(request);
+        }
+        await self.clients.claim();
+    })());
+});
+
+async function networkFirst(request) {
+    try {
+        const response = await fetch(request);
+        if (response.redirected && new URL(response.url).pathname === LOGIN) {
+            // Signed out: nothing cached for the previous session should linger.
+            await caches.delete(PAGES);
+        } else if (response.ok) {
+            const cache = await caches.open(PAGES);
+            await cache.put(request.url, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await caches.match(request.url) || await caches.match(new URL(DASHBOARD, self.location).href);
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok) {
+        const cache = await caches.open(ASSETS);
+        await cache.put(request, response.clone());
+    }
+    return response;
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (request.mode === 'navigate' && url.origin === self.location.origin && OFFLINE_PAGES.test(url.pathname)) {
+        event.respondWith(networkFirst(request));
+    } else if (url.origin === self.location.origin && url.pathname.startsWith(STATIC_PREFIX)) {
+        event.respondWith(cacheFirst(request));
+    }
+});
+
+// The dashboard sends the pages of the driver's current tasks; cache those
+// and forget pages of tasks that are no longer assigned.
+self.addEventListener('message', event => {
+    if (!event.data || event.data.type !== 'cache-pages') return;
+    event.waitUntil((async () => {
+        const cache = await caches.open(PAGES);
+        const wanted = new Set(event.data.urls.map(path => new URL(path, self.location).href));
+        for (const request of await cache.keys()) {
+            if (new URL(request.url).pathname.startsWith('/task/') && !wanted.has(request.url)) {
+                await cache.delete(request);
+            }
+        }
+        await Promise.all([...wanted].map(async url => {
+            const response = await fetch(url, { credentials: 'same-origin' });
+            if (response.ok && !response.redirected) await cache.put(url, response);
+        }));
+    })().catch(() => {}));
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === OfflineQueue.SYNC_TAG) {
+        event.waitUntil(OfflineQueue.syncAll().then(result => {
+            // Rejecting makes the browser retry the sync later.
+            if (result.pending) throw new Error('Completions still pending');
+        }));
+    }
+});